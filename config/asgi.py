@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Route the catalogue pages to their async views (see STORE_ASYNC_VIEWS)
+os.environ.setdefault('STORE_ASYNC_VIEWS', 'True')
+# Async views hop between threads, so a persistent connection would be held
+# per thread rather than per worker; pool with PgBouncer instead
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
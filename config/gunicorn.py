@@ -0,0 +1,49 @@
+"""
+Gunicorn settings, used by the Dockerfile:
+
+    gunicorn -c config/gunicorn.py
+
+The app is loaded once, in the master (preload_app), and warmed up there
+(store.warmup), so every worker forks with Django imported, the templates
+compiled and the caches primed instead of paying for that on its first
+requests. The environment variables below override the defaults.
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+# config.asgi:application with uvicorn.workers.UvicornWorker for the ASGI profile
+wsgi_app = os.environ.get('APP_MODULE', 'config.wsgi:application')
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Per worker, for the gthread class: requests mostly wait on the database
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+# Workers are recycled now and then to cap memory growth; the jitter keeps
+# them from all restarting at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def when_ready(server):
+    # In the master, after the app is loaded and before the first fork
+    from store.warmup import warm_up
+
+    try:
+        timings = warm_up()
+    except Exception:
+        # A database that isn't up yet only means cold workers
+        server.log.exception('Warm-up failed, workers will start cold')
+    else:
+        server.log.info('Warmed up: %s', ', '.join(f'{name} {ms:.0f} ms' for name, (ms, items) in timings.items()))
+    # Moves everything loaded so far out of the collector's view, so the
+    # workers' collections don't write to (and so copy) the pages they share
+    gc.freeze()
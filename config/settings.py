@@ -32,6 +32,10 @@ ALLOWED_HOSTS = [
     '.onrender.com',
 ]
 
+# Canonical address for absolute links in the sitemaps and the merchant feed,
+# which are cached once for the site rather than per Host header
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000').rstrip('/')
+
 
 # Application definition
 
@@ -46,8 +50,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.middleware.PerformanceMiddleware',
+    'store.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'store.middleware.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,8 +96,23 @@ if os.environ.get('PGDATABASE'):
             'PASSWORD': os.environ.get('PGPASSWORD'),
             'HOST': os.environ.get('PGHOST'),
             'PORT': os.environ.get('PGPORT', '5432'),
+            # Keep connections open between requests instead of paying for a
+            # TCP and auth handshake on each one; health checks replace a
+            # connection the server has dropped before it is reused
+            'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            # Behind PgBouncer in transaction mode a cursor can't outlive
+            # its transaction
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('PGBOUNCER', 'False') == 'True',
         }
     }
+    if os.environ.get('PGREPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ.get('PGREPLICA_HOST'),
+            'PORT': os.environ.get('PGREPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
 else:
     DATABASES = {
         'default': {
@@ -99,6 +121,42 @@ else:
         }
     }
 
+# Catalogue reads go to the replica when there is one (store.routers).
+# config.settings_test mirrors the default database as one for the tests;
+# without it the routing tests are skipped.
+DATABASE_ROUTERS = ['store.routers.PrimaryReplicaRouter']
+READ_REPLICA_DATABASE = 'replica' if os.environ.get('PGREPLICA_HOST') else None
+# How long after a write the client keeps reading from the primary
+READ_REPLICA_PIN_SECONDS = 10
+
+
+# Cache - Redis when available so every worker shares one copy, local memory otherwise
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    # Per process: a catalogue change only reaches the worker that made it.
+    # Fine for development; production must set REDIS_URL.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'boomerang',
+        }
+    }
+
+# Whole anonymous pages (store.middleware.PageCacheMiddleware). Only with the
+# shared cache: with a per-process one, the other workers would keep serving
+# a page for PAGE_CACHE_TIMEOUT after its price or stock changed.
+PAGE_CACHE_ENABLED = bool(os.environ.get('REDIS_URL'))
+
+# Sessions (and the cart inside them) are read from the cache and only
+# written through to the database when they change
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -136,7 +194,11 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# WhiteNoise's compressed manifest storage, plus the CSS/JS bundles and
+# critical CSS from store.assets. Hashed files are served with a far-future
+# immutable Cache-Control; the rest (unhashed originals) for a day.
+STATICFILES_STORAGE = 'store.assets.BundledStaticFilesStorage'
+WHITENOISE_MAX_AGE = 60 * 60 * 24
 
 # Media files (Images)
 MEDIA_URL = 'media/'
@@ -152,3 +214,26 @@ EMAIL_HOST_PASSWORD = 'your-app-password'  # Allow user to configure this later
 DEFAULT_FROM_EMAIL = 'Boomerang Digital Solutions <boomerangdigitalsolutions@gmail.com>'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Serve home, shop, product and order confirmation pages from their async
+# variants. Only worth it under ASGI (config.asgi turns it on); under WSGI
+# every async view pays for an event loop per request.
+STORE_ASYNC_VIEWS = os.environ.get('STORE_ASYNC_VIEWS', 'False') == 'True'
+
+# Request instrumentation (store.middleware.PerformanceMiddleware)
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 100))
+REPEATED_QUERY_THRESHOLD = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'store': {
+            'handlers': ['console'],
+            'level': os.environ.get('STORE_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
@@ -0,0 +1,25 @@
+"""
+Settings for the test run:
+
+    python manage.py test --settings=config.settings_test
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, LOGGING
+
+# A mirror of the default database stands in for the read replica, so the
+# routing (store.routers) can be exercised without a second server
+# (a real one, from PGREPLICA_HOST, is mirrored already)
+DATABASES = {**DATABASES}
+DATABASES.setdefault('replica', {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
+
+# Per-request lines would drown out test output
+LOGGING = {
+    **LOGGING,
+    'loggers': {
+        **LOGGING['loggers'],
+        'store': {**LOGGING['loggers']['store'], 'level': os.environ.get('STORE_LOG_LEVEL', 'ERROR')},
+    },
+}
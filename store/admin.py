@@ -1,37 +1,194 @@
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Category, Brand, Product, Order, OrderItem, SiteSetting
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Sum
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from .models import (
+    Category, Brand, Product, Order, OrderItem, SiteSetting, OutboxEmail, ProductRecommendation,
+    DailySales, DailyProductSales, DailyStatusSales, RollupCheckpoint,
+)
+from .pagination import EstimatedCountPaginator
+from .rollups import CHECKPOINT
+from .search import MIN_ORDER_TERM_LENGTH, search_orders
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug', 'created_at')
+    search_fields = ('name',)
     prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug', 'created_at')
+    search_fields = ('name',)
     prepopulated_fields = {'slug': ('name',)}
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'stock_status', 'category', 'brand', 'is_featured')
-    list_filter = ('stock_status', 'is_featured', 'category', 'brand')
+    list_display = ('name', 'price', 'stock_quantity', 'stock_status', 'category', 'brand', 'is_featured')
+    list_filter = ('stock_status', 'allow_preorder', 'is_featured', 'category', 'brand')
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
-    list_editable = ('price', 'stock_status', 'is_featured')
+    list_editable = ('price', 'stock_quantity', 'is_featured')
+    readonly_fields = ('stock_status',)
+    # category and brand are joined in rather than fetched per row
+    list_select_related = ('category', 'brand')
+    autocomplete_fields = ('category', 'brand')
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 class OrderItemInline(admin.TabularInline):
+    # Items are a snapshot of the order, so they are shown rather than edited
     model = OrderItem
-    readonly_fields = ('subtotal',)
+    fields = ('product', 'product_name', 'product_price', 'quantity', 'subtotal')
+    readonly_fields = fields
     extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('order_number', 'customer_name', 'total_amount', 'status', 'created_at')
-    list_filter = ('status', 'created_at')
-    search_fields = ('order_number', 'customer_name', 'customer_email')
+    list_display = ('order_number', 'customer_name', 'item_count', 'total_amount', 'status', 'created_at')
+    list_filter = ('status', 'payment_method')
+    # Searched through store.search (see get_search_results), not field by field
+    search_fields = ('order_number', 'customer_name', 'customer_email', 'customer_phone')
+    search_help_text = f'Order number, name, email or phone; at least {MIN_ORDER_TERM_LENGTH} characters.'
     inlines = [OrderItemInline]
     readonly_fields = ('created_at',)
+    date_hierarchy = 'created_at'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/store/order/change_list.html'
+    LOOKUP_LIMIT = 25
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('changelist'):
+            queryset = queryset.annotate(item_count=Count('items'))
+        return queryset
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_orders(queryset, search_term), False
+
+    def get_urls(self):
+        return [
+            path('lookup/', self.admin_site.admin_view(self.lookup_view), name='store_order_lookup'),
+        ] + super().get_urls()
+
+    def lookup_view(self, request):
+        """
+        Quick lookup for the phone: the latest orders matching a phone number,
+        name, email or order number, without the changelist's filters and counts.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        query = request.GET.get('q', '').strip()
+        orders = None
+        if query:
+            orders = (
+                search_orders(Order.objects.all(), query)
+                .only('order_number', 'customer_name', 'customer_phone', 'customer_email', 'total_amount',
+                      'status', 'created_at')
+                .order_by('-created_at')[:self.LOOKUP_LIMIT]
+            )
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Order lookup',
+            'opts': self.model._meta,
+            'query': query,
+            'orders': orders,
+            'limit': self.LOOKUP_LIMIT,
+            'min_length': MIN_ORDER_TERM_LENGTH,
+        }
+        return TemplateResponse(request, 'admin/store/order_lookup.html', context)
+
+    @admin.display(description='Items', ordering='item_count')
+    def item_count(self, obj):
+        return obj.item_count
 
 @admin.register(SiteSetting)
 class SiteSettingAdmin(admin.ModelAdmin):
     list_display = ('setting_key', 'setting_value', 'updated_at')
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+@admin.register(ProductRecommendation)
+class ProductRecommendationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'rank', 'recommended', 'score')
+    raw_id_fields = ('product', 'recommended')
+
+@admin.register(DailySales)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """
+    Read-only sales dashboard. Every figure comes from the daily rollup
+    tables (see store.rollups), never from Order or OrderItem.
+    """
+    PERIODS = (7, 30, 90, 365)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        if days not in self.PERIODS:
+            days = 30
+        since = timezone.localdate() - timedelta(days=days - 1)
+
+        def top(field):
+            return (
+                DailyProductSales.objects.filter(date__gte=since)
+                .values(field)
+                .annotate(units=Sum('units'), revenue=Sum('revenue'))
+                .order_by('-revenue')[:10]
+            )
+
+        daily = DailySales.objects.filter(date__gte=since)
+        context = {
+            **self.admin_site.each_context(request),
+            **(extra_context or {}),
+            'title': 'Sales dashboard',
+            'opts': self.model._meta,
+            'periods': self.PERIODS,
+            'days': days,
+            'since': since,
+            'totals': daily.aggregate(order_count=Sum('order_count'), units=Sum('units'), revenue=Sum('revenue')),
+            'daily': daily.order_by('-date'),
+            'top_products': top('product_name'),
+            'top_categories': top('category__name'),
+            'top_brands': top('brand__name'),
+            'statuses': (
+                DailyStatusSales.objects.filter(date__gte=since)
+                .values('status')
+                .annotate(order_count=Sum('order_count'), revenue=Sum('revenue'))
+                .order_by('-order_count')
+            ),
+            'checkpoint': RollupCheckpoint.objects.filter(name=CHECKPOINT).first(),
+        }
+        return TemplateResponse(request, 'admin/store/sales_dashboard.html', context)
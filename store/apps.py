@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class StoreConfig(AppConfig):
     name = 'store'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        # Patched once at start-up rather than from the middleware's __init__
+        if 'store.middleware.PerformanceMiddleware' in settings.MIDDLEWARE:
+            from .middleware import install_instrumentation
+            install_instrumentation()
@@ -0,0 +1,161 @@
+import re
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# Built by collectstatic from their sources, in order. Bundles sit next to
+# their sources so relative url()s keep working.
+BUNDLES = {
+    'store/assets/css/site.css': (
+        'store/assets/css/design-system.css',
+        'store/assets/css/components.css',
+        'store/assets/css/animations.css',
+        'store/assets/css/responsive.css',
+    ),
+    'store/assets/js/site.js': (
+        'store/assets/js/main.js',
+    ),
+}
+STYLESHEET_BUNDLE = 'store/assets/css/site.css'
+SCRIPT_BUNDLE = 'store/assets/js/site.js'
+
+# Rules from the stylesheet bundle that style the first screen (header,
+# navigation, hero, buttons), inlined into base.html
+CRITICAL_CSS = 'store/assets/css/critical.css'
+CRITICAL_SELECTOR = re.compile(
+    r'^(?::root|\*|html|body|h[1-3]|p|a|img|button|input|\.container|\.nav-[\w-]+|\.mobile-menu-toggle'
+    r'|\.search-[\w-]+|\.cart-[\w-]+|\.btn[\w-]*|\.hero[\w-]*|\.alert[\w-]*)(?![\w-])'
+)
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(css):
+    css = _CSS_COMMENT.sub('', css)
+    css = _CSS_SPACE.sub(' ', css)
+    css = _CSS_PUNCTUATION.sub(r'\1', css)
+    css = css.replace(': ', ':').replace(';}', '}')
+    return css.strip()
+
+
+def minify_js(js):
+    """
+    Drops comments, indentation and blank lines. Line breaks are kept so
+    automatic semicolon insertion still applies, and template literals are
+    left untouched.
+    """
+    lines, in_comment, in_template = [], False, False
+    for line in js.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if in_comment:
+                in_comment = '*/' not in stripped
+                continue
+            if stripped.startswith('/*'):
+                in_comment = '*/' not in stripped
+                continue
+            if not stripped or stripped.startswith('//'):
+                continue
+            lines.append(stripped)
+        if (line.count('`') - line.count('\\`')) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+def css_blocks(css):
+    """Splits minified CSS into top-level (prelude, body) pairs."""
+    blocks, depth, start, prelude = [], 0, 0, ''
+    for i, char in enumerate(css):
+        if char == '{':
+            if depth == 0:
+                prelude, start = css[start:i], i + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((prelude, css[start:i]))
+                start = i + 1
+    return blocks
+
+
+def critical_css(css):
+    rules, keyframes = [], {}
+    for prelude, body in css_blocks(css):
+        if prelude.startswith('@keyframes'):
+            keyframes[prelude.split()[-1]] = f'{prelude}{{{body}}}'
+        elif prelude.startswith('@media'):
+            inner = critical_css(body)
+            if inner:
+                rules.append(f'{prelude}{{{inner}}}')
+        elif not prelude.startswith('@'):
+            if any(CRITICAL_SELECTOR.match(selector) for selector in prelude.split(',')):
+                rules.append(f'{prelude}{{{body}}}')
+    critical = ''.join(rules)
+    # Animations the first screen starts with
+    critical += ''.join(rule for name, rule in keyframes.items() if re.search(rf'\b{re.escape(name)}\b', critical))
+    return critical
+
+
+def build_bundles(storage):
+    """Writes the bundles and the critical CSS into ``storage``; returns their names."""
+    built = []
+    for name, sources in BUNDLES.items():
+        minify = minify_css if name.endswith('.css') else minify_js
+        parts = []
+        for source in sources:
+            with storage.open(source) as f:
+                parts.append(minify(f.read().decode('utf-8')))
+        content = '\n'.join(parts)
+        for path, data in [(name, content)] + ([(CRITICAL_CSS, critical_css(content))] if name == STYLESHEET_BUNDLE else []):
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(data.encode('utf-8')))
+            built.append(path)
+    return built
+
+
+class BundledStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's storage with the bundles built first, so collectstatic
+    hashes them and writes their gzip and brotli siblings with everything
+    else. WhiteNoise serves hashed names with far-future immutable caching.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for name in build_bundles(self):
+                paths[name] = (self, name)
+        yield from super().post_process(paths, dry_run, **options)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # The templates reference images that aren't in the repo yet (the
+            # favicon, the product placeholder); link them unhashed, to a
+            # 404, rather than failing the whole page
+            return name
+
+
+def is_bundled(name):
+    # Only a collectstatic run through BundledStaticFilesStorage builds the
+    # bundles; under runserver and in tests the sources are linked instead
+    return name in getattr(staticfiles_storage, 'hashed_files', {})
+
+
+_critical_cache = {}
+
+
+def get_critical_css():
+    if not is_bundled(CRITICAL_CSS):
+        return ''
+    stored = staticfiles_storage.stored_name(CRITICAL_CSS)
+    if stored not in _critical_cache:
+        with staticfiles_storage.open(stored) as f:
+            _critical_cache[stored] = f.read().decode('utf-8')
+    return _critical_cache[stored]
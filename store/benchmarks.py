@@ -0,0 +1,101 @@
+import statistics
+import time
+from contextlib import ExitStack
+from urllib.parse import urlencode
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import urls
+from .feeds import SHARD_SIZE
+from .models import Order, Product
+from .views import SHOP_ORDERINGS
+
+# Listing variants worth timing besides the bare routes
+SHOP_VARIANTS = {
+    'shop:category': lambda product: {'category': product.category.slug} if product.category else None,
+    'shop:search': lambda product: {'q': product.name.split()[0]},
+    'shop:price': lambda product: {'min_price': 10000, 'max_price': 50000, 'sort': 'price_asc'},
+}
+
+
+def route_targets():
+    """
+    (name, path) for every route in store.urls, with URL arguments taken from
+    sample rows, plus the shop listing variants. Routes whose arguments have
+    no sample row get a path of None.
+    """
+    product = Product.objects.select_related('category').order_by('-is_featured', 'id').first()
+    order = Order.objects.order_by('-id').first()
+    samples = {
+        'slug': product.slug if product else None,
+        'order_number': order.order_number if order else None,
+        'shard': product.id // SHARD_SIZE if product else None,
+    }
+
+    targets = []
+    for pattern in urls.urlpatterns:
+        arguments = list(pattern.pattern.converters)
+        kwargs = {argument: samples.get(argument) for argument in arguments}
+        if any(value is None for value in kwargs.values()):
+            targets.append((pattern.name, None))
+        else:
+            targets.append((pattern.name, reverse(pattern.name, kwargs=kwargs)))
+    if product:
+        for name, params in SHOP_VARIANTS.items():
+            params = params(product)
+            # shop() falls back to the default ordering on an unknown sort,
+            # which would time the wrong query without any sign of it
+            if params and params.get('sort', 'newest') not in SHOP_ORDERINGS:
+                raise ValueError(f"{name} uses unknown sort {params['sort']!r}")
+            if params:
+                targets.append((name, f"{reverse('shop')}?{urlencode(params)}"))
+    return targets
+
+
+def fill_cart(client, size=3):
+    """Puts a few products in the client's cart so cart and checkout render in full."""
+    for product in Product.objects.filter(stock_status='in_stock').order_by('id')[:size]:
+        client.post(reverse('cart'), {'action': 'add', 'product_id': product.id, 'quantity': 1})
+    client.get(reverse('cart'))  # consume the flash messages
+
+
+def measure(client, path):
+    """(status, milliseconds, queries) for one GET; queries on every database alias count."""
+    with ExitStack() as stack:
+        # Catalogue reads go to the replica when there is one (store.routers)
+        captures = [stack.enter_context(CaptureQueriesContext(db)) for db in connections.all()]
+        start = time.perf_counter()
+        response = client.get(path)
+        if response.streaming:
+            # Streamed bodies (sitemaps, feeds) are generated as they are read
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - start) * 1000
+    return response.status_code, elapsed, sum(len(queries.captured_queries) for queries in captures)
+
+
+def percentile(timings, percent):
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[percent - 1]
+
+
+def benchmark(client, path, requests=50, warmup=5):
+    for _ in range(warmup):
+        client.get(path)
+    statuses, timings, queries = set(), [], []
+    for _ in range(requests):
+        status, elapsed, count = measure(client, path)
+        statuses.add(status)
+        timings.append(elapsed)
+        queries.append(count)
+    return {
+        'status': '/'.join(str(status) for status in sorted(statuses)),
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'max': max(timings),
+        'queries': int(statistics.median(queries)),
+        'max_queries': max(queries),
+    }
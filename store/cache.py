@@ -0,0 +1,107 @@
+import hashlib
+import time
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Brand, Category, SiteSetting
+
+# Navigation data changes rarely, so it is kept in the cache until one of the
+# signal handlers in store.signals drops it. The timeout only bounds how stale
+# a worker can get when CACHES points at a per-process backend.
+NAV_CACHE_TIMEOUT = 60 * 15
+
+SETTINGS_CACHE_KEY = 'store:nav:settings'
+CATEGORIES_CACHE_KEY = 'store:nav:categories'
+BRANDS_CACHE_KEY = 'store:nav:brands'
+CATALOG_VERSION_KEY = 'store:catalog:version'
+
+
+def get_site_settings():
+    settings = cache.get(SETTINGS_CACHE_KEY)
+    if settings is None:
+        settings = dict(SiteSetting.objects.values_list('setting_key', 'setting_value'))
+        cache.set(SETTINGS_CACHE_KEY, settings, NAV_CACHE_TIMEOUT)
+    return settings
+
+
+def get_nav_categories():
+    categories = cache.get(CATEGORIES_CACHE_KEY)
+    if categories is None:
+        categories = list(Category.objects.annotate(product_count=Count('products')))
+        cache.set(CATEGORIES_CACHE_KEY, categories, NAV_CACHE_TIMEOUT)
+    return categories
+
+
+def get_nav_brands():
+    brands = cache.get(BRANDS_CACHE_KEY)
+    if brands is None:
+        brands = list(Brand.objects.all())
+        cache.set(BRANDS_CACHE_KEY, brands, NAV_CACHE_TIMEOUT)
+    return brands
+
+
+async def aget_site_settings():
+    settings = await cache.aget(SETTINGS_CACHE_KEY)
+    if settings is None:
+        settings = {key: value async for key, value in SiteSetting.objects.values_list('setting_key', 'setting_value')}
+        await cache.aset(SETTINGS_CACHE_KEY, settings, NAV_CACHE_TIMEOUT)
+    return settings
+
+
+async def aget_nav_categories():
+    categories = await cache.aget(CATEGORIES_CACHE_KEY)
+    if categories is None:
+        categories = [category async for category in Category.objects.annotate(product_count=Count('products'))]
+        await cache.aset(CATEGORIES_CACHE_KEY, categories, NAV_CACHE_TIMEOUT)
+    return categories
+
+
+async def aget_nav_brands():
+    brands = await cache.aget(BRANDS_CACHE_KEY)
+    if brands is None:
+        brands = [brand async for brand in Brand.objects.all()]
+        await cache.aset(BRANDS_CACHE_KEY, brands, NAV_CACHE_TIMEOUT)
+    return brands
+
+
+def invalidate_site_settings():
+    cache.delete(SETTINGS_CACHE_KEY)
+
+
+def invalidate_nav_categories():
+    cache.delete(CATEGORIES_CACHE_KEY)
+
+
+def invalidate_nav_brands():
+    cache.delete(BRANDS_CACHE_KEY)
+
+
+def get_catalog_version():
+    """
+    Token that changes whenever a Product, Category or Brand is saved or
+    deleted. Derived caches put it in their keys instead of tracking and
+    deleting their own entries.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def page_cache_key(request):
+    """
+    Cache key for an anonymous page (see store.middleware.PageCacheMiddleware).
+    Pages show the catalogue, the site settings and links to the current
+    static bundles, so a change to any of them moves every page to a new key.
+    """
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    site_settings = hashlib.md5(repr(sorted(get_site_settings().items())).encode()).hexdigest()
+    static = getattr(staticfiles_storage, 'manifest_hash', '')
+    return f'store:page:{get_catalog_version()}:{site_settings}:{static}:{url}'
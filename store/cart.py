@@ -0,0 +1,111 @@
+from decimal import Decimal
+
+from .models import Product
+
+CART_SESSION_KEY = 'cart'
+
+
+class Cart:
+    """
+    Session cart kept as plain ids and numbers:
+
+        {'items': {product_id: quantity}, 'prices': {product_id: price},
+         'count': n, 'total': 'amount'}
+
+    Count and total are updated on every mutation from the price snapshot
+    taken when a product was added, so showing the header badge never
+    touches the Product table. Prices are only revalidated at checkout
+    (see store.orders.place_order).
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.data = session.get(CART_SESSION_KEY) or {}
+        if 'items' not in self.data:
+            self.upgrade()
+
+    def upgrade(self):
+        # Older sessions stored {product_id: {'quantity': n}}
+        items = {str(pid): int(item.get('quantity', 0)) for pid, item in self.data.items()}
+        self.data = {'items': items, 'prices': {}, 'count': 0, 'total': '0'}
+        if items:
+            self.refresh_prices()
+            self.save()
+
+    def __len__(self):
+        return self.data['count']
+
+    @property
+    def items(self):
+        return self.data['items']
+
+    @property
+    def count(self):
+        return self.data['count']
+
+    @property
+    def total(self):
+        return Decimal(self.data['total'])
+
+    def add(self, product_id, quantity=1):
+        product_id = str(product_id)
+        self.set(product_id, self.items.get(product_id, 0) + quantity)
+
+    def set(self, product_id, quantity):
+        product_id = str(product_id)
+        if not product_id.isdigit():
+            # Not a product id (a missing or tampered form field); nothing to add
+            return
+        if quantity <= 0:
+            self.remove(product_id)
+            return
+        if product_id not in self.data['prices']:
+            price = Product.objects.filter(pk=product_id).values_list('price', flat=True).first()
+            if price is None:
+                return
+            self.data['prices'][product_id] = str(price)
+        self.items[product_id] = quantity
+        self.save()
+
+    def remove(self, product_id):
+        product_id = str(product_id)
+        self.items.pop(product_id, None)
+        self.data['prices'].pop(product_id, None)
+        self.save()
+
+    def clear(self):
+        self.data = {'items': {}, 'prices': {}, 'count': 0, 'total': '0'}
+        self.save()
+
+    def refresh_prices(self, products=None):
+        if products is None:
+            products = Product.objects.filter(id__in=self.items.keys()).only('id', 'price')
+        prices = {str(p.id): str(p.price) for p in products}
+        # Products deleted since they were added drop out of the cart
+        self.data['items'] = {pid: qty for pid, qty in self.items.items() if pid in prices}
+        self.data['prices'] = {pid: prices[pid] for pid in self.items}
+
+    def save(self):
+        prices = self.data['prices']
+        self.data['count'] = sum(self.items.values())
+        self.data['total'] = str(sum((Decimal(prices[pid]) * qty for pid, qty in self.items.items()), Decimal(0)))
+        self.session[CART_SESSION_KEY] = self.data
+        self.session.modified = True
+
+    def lines(self):
+        """
+        Cart rows with their Product objects for the cart and checkout
+        pages, priced at current prices. One query.
+        """
+        products = {
+            str(p.id): p
+            for p in Product.objects.filter(id__in=self.items.keys()).select_related('category', 'brand')
+        }
+        if {pid: str(p.price) for pid, p in products.items()} != self.data['prices']:
+            self.refresh_prices(products.values())
+            self.save()
+        lines = []
+        for product_id, quantity in self.items.items():
+            product = products[product_id]
+            lines.append({'product': product, 'quantity': quantity, 'subtotal': product.price * quantity})
+        return lines
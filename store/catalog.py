@@ -0,0 +1,241 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import cache
+from .models import Brand, Category, Product
+from .search import get_search_backend
+from .specs import index_attributes, parse_specifications
+
+# Columns per model, in file order. FKs are written as slugs.
+COLUMNS = {
+    'categories': ['slug', 'name', 'description'],
+    'brands': ['slug', 'name', 'logo'],
+    'products': [
+        'slug', 'name', 'description', 'specifications', 'price', 'category', 'brand',
+        'image', 'stock_quantity', 'allow_preorder', 'stock_status', 'is_featured',
+    ],
+}
+MODELS = {'categories': Category, 'brands': Brand, 'products': Product}
+
+STOCK_STATUSES = {value for value, label in Product.STOCK_STATUS_CHOICES}
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    One dict per CSV row or JSONL line. JSONL lines that can't be read come
+    through as a RowError, and blank lines as None, so rows stay numbered by
+    line and the importer can report and skip them.
+    """
+    if fmt == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                yield None
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield RowError(f'invalid JSON: {e}')
+                continue
+            yield row if isinstance(row, dict) else RowError('expected a JSON object')
+    else:
+        yield from csv.DictReader(stream)
+
+
+def write_rows(stream, fmt, columns, rows):
+    if fmt == 'jsonl':
+        for row in rows:
+            stream.write(json.dumps(row, default=str) + '\n')
+    else:
+        writer = csv.DictWriter(stream, fieldnames=columns)
+        writer.writeheader()
+        for row in rows:
+            # Structured columns (specifications) go into one cell as JSON
+            writer.writerow({
+                column: json.dumps(value) if isinstance(value, (dict, list)) else value
+                for column, value in row.items()
+            })
+
+
+def export_rows(model_name, chunk_size=2000):
+    """
+    Streams one dict per row with iterator(), so memory stays flat however
+    big the table is.
+    """
+    columns = COLUMNS[model_name]
+    if model_name == 'products':
+        values = [c for c in columns if c not in ('category', 'brand')] + ['category__slug', 'brand__slug']
+        queryset = Product.objects.order_by('id').values(*values)
+        for row in queryset.iterator(chunk_size=chunk_size):
+            row['category'] = row.pop('category__slug') or ''
+            row['brand'] = row.pop('brand__slug') or ''
+            yield {column: row[column] for column in columns}
+    else:
+        yield from MODELS[model_name].objects.order_by('id').values(*columns).iterator(chunk_size=chunk_size)
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(row, column):
+    value = row.get(column)
+    return '' if value is None else str(value).strip()
+
+
+def _bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+class CatalogImporter:
+    """
+    Upserts rows keyed on slug in chunks: one SELECT to count existing slugs
+    and one bulk INSERT ... ON CONFLICT per chunk. Category and brand
+    references are resolved from an in-memory slug map and created in bulk
+    when missing.
+    """
+
+    def __init__(self, model_name, chunk_size=1000):
+        self.model_name = model_name
+        self.model = MODELS[model_name]
+        self.chunk_size = chunk_size
+        self.created = self.updated = 0
+        self.errors = []
+        self.fk_ids = {}
+
+    def build(self, row):
+        name = _text(row, 'name')
+        slug = _text(row, 'slug') or slugify(name)
+        if not slug or not name:
+            raise RowError('name is required')
+        if self.model_name == 'categories':
+            return Category(slug=slug, name=name, description=_text(row, 'description') or None)
+        if self.model_name == 'brands':
+            return Brand(slug=slug, name=name, logo=_text(row, 'logo') or None)
+
+        try:
+            price = Decimal(_text(row, 'price'))
+        except InvalidOperation:
+            price = None
+        if price is None or not price.is_finite() or price < 0 or price >= 10 ** 8:
+            raise RowError(f"invalid price {row.get('price')!r}")
+        if 'stock_quantity' in row:
+            quantity = _text(row, 'stock_quantity')
+            try:
+                quantity = int(quantity) if quantity else None
+            except ValueError:
+                raise RowError(f'invalid stock_quantity {quantity!r}')
+            if quantity is not None and quantity < 0:
+                raise RowError(f'invalid stock_quantity {quantity!r}')
+            allow_preorder = _bool(row.get('allow_preorder', ''))
+        else:
+            # Files from before stock quantities: only the status is known
+            stock_status = _text(row, 'stock_status') or 'in_stock'
+            if stock_status not in STOCK_STATUSES:
+                raise RowError(f'invalid stock_status {stock_status!r}')
+            quantity = None if stock_status == 'in_stock' else 0
+            allow_preorder = stock_status == 'pre_order'
+        product = Product(
+            slug=slug,
+            name=name,
+            description=_text(row, 'description') or None,
+            specifications=parse_specifications(row.get('specifications')),
+            price=price,
+            image=_text(row, 'image') or None,
+            stock_quantity=quantity,
+            allow_preorder=allow_preorder,
+            stock_status=Product.stock_status_for(quantity, allow_preorder),
+            is_featured=_bool(row.get('is_featured', '')),
+        )
+        product._fk_slugs = (_text(row, 'category'), _text(row, 'brand'))
+        return product
+
+    def resolve_fks(self, model, slugs):
+        ids = self.fk_ids.setdefault(model, {})
+        missing = {slug for slug in slugs if slug and slug not in ids}
+        if missing:
+            ids.update(model.objects.filter(slug__in=missing).values_list('slug', 'id'))
+            new = [model(slug=slug, name=slug.replace('-', ' ').title()) for slug in missing - ids.keys()]
+            if new:
+                model.objects.bulk_create(new)
+                ids.update(model.objects.filter(slug__in=[o.slug for o in new]).values_list('slug', 'id'))
+        return ids
+
+    def import_chunk(self, rows, first_row):
+        objects = {}
+        for number, row in enumerate(rows, first_row):
+            if row is None:
+                continue
+            if isinstance(row, RowError):
+                self.errors.append((number, str(row)))
+                continue
+            try:
+                obj = self.build(row)
+            except (RowError, TypeError, AttributeError) as e:
+                self.errors.append((number, str(e)))
+                continue
+            # Later rows win when a chunk repeats a slug
+            objects[obj.slug] = obj
+        if not objects:
+            return
+
+        with transaction.atomic():
+            if self.model_name == 'products':
+                categories = self.resolve_fks(Category, {o._fk_slugs[0] for o in objects.values()})
+                brands = self.resolve_fks(Brand, {o._fk_slugs[1] for o in objects.values()})
+                for obj in objects.values():
+                    obj.category_id = categories.get(obj._fk_slugs[0])
+                    obj.brand_id = brands.get(obj._fk_slugs[1])
+
+            existing = set(self.model.objects.filter(slug__in=objects.keys()).values_list('slug', flat=True))
+            fields = [c for c in COLUMNS[self.model_name] if c not in ('slug', 'category', 'brand')]
+            if self.model_name == 'products':
+                fields += ['category', 'brand']
+            # A single INSERT ... ON CONFLICT (slug) DO UPDATE per chunk
+            self.model.objects.bulk_create(
+                objects.values(),
+                update_conflicts=True,
+                unique_fields=['slug'],
+                update_fields=fields + ['updated_at'],
+            )
+
+            if self.model_name == 'products':
+                # bulk writes skip post_save, so keep the search and attribute indexes in step here
+                saved = list(self.model.objects.filter(slug__in=objects.keys()).only('id', 'specifications'))
+                get_search_backend().update([product.id for product in saved])
+                index_attributes(saved)
+
+        self.created += len(objects) - len(existing)
+        self.updated += len(existing)
+
+    def run(self, rows, progress=None):
+        number = 1
+        for chunk in chunked(rows, self.chunk_size):
+            self.import_chunk(chunk, number)
+            number += len(chunk)
+            if progress:
+                progress(self)
+
+        # Signals were skipped for the bulk writes, so drop derived caches once
+        cache.invalidate_nav_categories()
+        cache.invalidate_nav_brands()
+        cache.bump_catalog_version()
+        return self
@@ -0,0 +1,215 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Max, Value, When
+
+from .cache import get_catalog_version, get_nav_brands, get_nav_categories
+from .models import Product, ProductAttribute
+from .search import search_products
+from .specs import attribute_filters, filter_by_attributes
+
+FACET_CACHE_TIMEOUT = 60 * 10
+
+# (key, label, min_price, max_price) in KES. Buckets are half-open, so a
+# product at exactly 10,000 is in 10k_25k only; the last one is open-ended.
+PRICE_BUCKETS = [
+    ('under_10k', 'Under 10,000', None, 10000),
+    ('10k_25k', '10,000 - 25,000', 10000, 25000),
+    ('25k_50k', '25,000 - 50,000', 25000, 50000),
+    ('50k_100k', '50,000 - 100,000', 50000, 100000),
+    ('over_100k', 'Over 100,000', 100000, None),
+]
+
+# Product.price's resolution. max_price is inclusive, so a bucket's link asks
+# for up to one cent under the bucket's bound
+PRICE_STEP = Decimal('0.01')
+
+FACET_PARAMS = ('q', 'category', 'brand', 'stock', 'min_price', 'max_price')
+
+# Attribute filters are offered per category, for specs with few distinct values
+MAX_ATTRIBUTE_OPTIONS = 12
+
+
+def facet_signature(filters, attributes=None):
+    params = {name: filters.get(name) or '' for name in FACET_PARAMS}
+    params['attributes'] = attributes or {}
+    return hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def price_bucket_expression():
+    whens = [
+        When(price__lt=max_price, then=Value(key))
+        for key, label, min_price, max_price in PRICE_BUCKETS
+        if max_price is not None
+    ]
+    return Case(*whens, default=Value(PRICE_BUCKETS[-1][0]), output_field=CharField())
+
+
+def facet_rows(filters, attributes=None):
+    """
+    One GROUP BY over every facet dimension at once. Search, price range and
+    attribute filters are applied in SQL; category, brand and stock are left
+    out so each facet can show counts for its alternatives (see count_facets).
+    """
+    products = filter_by_attributes(Product.objects.all(), attributes or {})
+    if filters.get('q'):
+        products = search_products(products, filters['q'])
+    if filters.get('min_price'):
+        products = products.filter(price__gte=filters['min_price'])
+    if filters.get('max_price'):
+        products = products.filter(price__lte=filters['max_price'])
+    return list(
+        products.annotate(price_bucket=price_bucket_expression())
+        .values('category_id', 'brand_id', 'stock_status', 'price_bucket')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+
+def count_facets(rows, category_id=None, brand_id=None, stock_status=None):
+    selected = {'category_id': category_id, 'brand_id': brand_id, 'stock_status': stock_status}
+    counts = {'category_id': {}, 'brand_id': {}, 'stock_status': {}, 'price_bucket': {}}
+
+    for row in rows:
+        misses = [dim for dim, value in selected.items() if value is not None and row[dim] != value]
+        if len(misses) > 1:
+            continue
+        # A row matching every selection counts everywhere; a row missing just
+        # one selection still counts towards that facet's alternatives.
+        for dim in misses or counts:
+            bucket = counts[dim]
+            bucket[row[dim]] = bucket.get(row[dim], 0) + row['count']
+
+    return {
+        'categories': counts['category_id'],
+        'brands': counts['brand_id'],
+        'stock': counts['stock_status'],
+        'price': counts['price_bucket'],
+    }
+
+
+def _slug_to_id(nav_objects, slug):
+    if not slug:
+        return None
+    # An unknown slug matches no product, and no row has id 0
+    return next((obj.id for obj in nav_objects() if obj.slug == slug), 0)
+
+
+def get_facet_counts(filters):
+    """
+    Per-category, per-brand, per-stock-status and per-price-bucket product
+    counts for the given shop() filters, cached per filter signature and
+    catalog version.
+    """
+    attributes = attribute_filters(filters)
+    key = f'store:facets:{get_catalog_version()}:{facet_signature(filters, attributes)}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = count_facets(
+            facet_rows(filters, attributes),
+            category_id=_slug_to_id(get_nav_categories, filters.get('category')),
+            brand_id=_slug_to_id(get_nav_brands, filters.get('brand')),
+            stock_status=filters.get('stock') or None,
+        )
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+    return counts
+
+
+def attribute_option_rows(filters, attributes=None):
+    """
+    (key, value) counts over the products matching every shop filter except
+    the attribute being counted, so picking 16GB still offers 8GB and 32GB
+    while the storage counts narrow to 16GB products. One query, plus one
+    per selected attribute.
+    """
+    attributes = attributes or {}
+    products = Product.objects.filter(category__slug=filters['category'])
+    if filters.get('brand'):
+        products = products.filter(brand__slug=filters['brand'])
+    if filters.get('stock'):
+        products = products.filter(stock_status=filters['stock'])
+    if filters.get('min_price'):
+        products = products.filter(price__gte=filters['min_price'])
+    if filters.get('max_price'):
+        products = products.filter(price__lte=filters['max_price'])
+    if filters.get('q'):
+        products = search_products(products, filters['q'])
+
+    # The unselected attributes, under every selection...
+    selections = [(
+        filter_by_attributes(products, attributes),
+        ProductAttribute.objects.exclude(key__in=list(attributes)),
+    )]
+    # ...and each selected one under the others
+    for key in attributes:
+        others = {other: values for other, values in attributes.items() if other != key}
+        selections.append((filter_by_attributes(products, others), ProductAttribute.objects.filter(key=key)))
+
+    rows = []
+    for matching, options in selections:
+        rows += (
+            options.filter(product__in=matching.values('id'))
+            .values('key', 'value')
+            .annotate(label=Max('name'), count=Count('id'))
+            .order_by('key', 'value')
+        )
+    return sorted(rows, key=lambda row: (row['key'], row['value']))
+
+
+def get_attribute_options(filters):
+    """
+    [(name, key, [(value, count, selected), ...]), ...] for the selected
+    category, or [] when no category is selected.
+    """
+    if not filters.get('category'):
+        return []
+    attributes = attribute_filters(filters)
+    key = f'store:facets:attributes:{get_catalog_version()}:{facet_signature(filters, attributes)}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = attribute_option_rows(filters, attributes)
+        cache.set(key, rows, FACET_CACHE_TIMEOUT)
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['key'], []).append(row)
+    options = []
+    for attribute, values in groups.items():
+        if len(values) > MAX_ATTRIBUTE_OPTIONS:
+            continue
+        selected = filters.getlist(attribute)
+        options.append((
+            values[0]['label'],
+            attribute,
+            [(row['value'], row['count'], row['value'] in selected) for row in values],
+        ))
+    return options
+
+
+def get_shop_facets(params):
+    """
+    Facet counts for the shop sidebar, joined to the cached navigation
+    objects. ``params`` is the request's query dict.
+    """
+    counts = get_facet_counts(params)
+
+    price = []
+    for key, label, min_price, max_price in PRICE_BUCKETS:
+        query = params.copy()
+        for name in ('page', 'cursor', 'min_price', 'max_price'):
+            query.pop(name, None)
+        if min_price is not None:
+            query['min_price'] = min_price
+        if max_price is not None:
+            query['max_price'] = max_price - PRICE_STEP
+        price.append({'label': label, 'count': counts['price'].get(key, 0), 'query': query.urlencode()})
+
+    return {
+        'categories': [(c, counts['categories'].get(c.id, 0)) for c in get_nav_categories()],
+        'brands': [(b, counts['brands'].get(b.id, 0)) for b in get_nav_brands()],
+        'stock': counts['stock'],
+        'price': price,
+        'attributes': get_attribute_options(params),
+    }
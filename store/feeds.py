@@ -0,0 +1,227 @@
+import csv
+import io
+from xml.sax.saxutils import escape
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.urls import reverse
+from django.utils.html import strip_tags
+
+from .cache import get_catalog_version
+from .models import Brand, Category, Product
+
+# Products are sharded on id ranges, so an edit only ever invalidates the
+# shard its product lives in. Well under the sitemap limit of 50,000 URLs.
+SHARD_SIZE = 10000
+CHUNK_SIZE = 2000
+# Shards are keyed on their contents (see shard_stamps), so they can live
+# until evicted; the timeout only bounds how long a dead key lingers
+FEED_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+SITEMAP_PAGES = ('home', 'shop', 'about', 'contact', 'privacy', 'terms', 'warranty')
+
+AVAILABILITY = {'in_stock': 'in_stock', 'out_of_stock': 'out_of_stock', 'pre_order': 'preorder'}
+FEED_COLUMNS = ['id', 'title', 'description', 'link', 'image_link', 'availability', 'price', 'brand',
+                'product_type', 'condition']
+CURRENCY = 'KES'
+
+
+def shard_stamps():
+    """
+    {shard: (last updated_at, product count)} in one aggregate query, cached
+    per catalogue version. A shard's stamp changes when one of its products
+    is edited, added or deleted, and its cached output is keyed on it.
+    """
+    key = f'store:feeds:shards:{get_catalog_version()}'
+    stamps = cache.get(key)
+    if stamps is None:
+        rows = (
+            Product.objects.order_by()
+            .annotate(shard=F('id') / SHARD_SIZE)
+            .values('shard')
+            .annotate(last_modified=Max('updated_at'), count=Count('id'))
+            .order_by('shard')
+        )
+        stamps = {row['shard']: (row['last_modified'], row['count']) for row in rows}
+        cache.set(key, stamps, FEED_CACHE_TIMEOUT)
+    return stamps
+
+
+def taxonomy_stamp():
+    # Feed rows carry category and brand names
+    key = f'store:feeds:taxonomy:{get_catalog_version()}'
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = max(
+            [value for value in (
+                Category.objects.aggregate(last=Max('updated_at'))['last'],
+                Brand.objects.aggregate(last=Max('updated_at'))['last'],
+            ) if value is not None],
+            default=None,
+        )
+        cache.set(key, stamp, FEED_CACHE_TIMEOUT)
+    return stamp
+
+
+def product_url(base_url):
+    """A slug -> absolute product URL function; reverse() per row dominates a cold shard."""
+    prefix, suffix = (base_url + reverse('product_detail', args=['slug'])).rsplit('slug', 1)
+    return lambda slug: f'{prefix}{slug}{suffix}'
+
+
+def shard_products(shard):
+    return Product.objects.filter(id__gte=shard * SHARD_SIZE, id__lt=(shard + 1) * SHARD_SIZE).order_by('id')
+
+
+def cached_stream(key, render):
+    """
+    Yields the cached text at ``key``, or streams ``render()`` while keeping
+    a copy, cached once the whole of it has been sent.
+    """
+    text = cache.get(key)
+    if text is not None:
+        yield text
+        return
+    parts = []
+    for part in render():
+        parts.append(part)
+        yield part
+    cache.set(key, ''.join(parts), FEED_CACHE_TIMEOUT)
+
+
+def _stamp_key(stamp):
+    last_modified, count = stamp
+    return f'{last_modified.timestamp() if last_modified else 0}:{count}'
+
+
+# Sitemaps
+
+def sitemap_index(base_url):
+    stamps = shard_stamps()
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    yield f'<sitemap><loc>{escape(base_url + reverse("sitemap_pages"))}</loc></sitemap>\n'
+    for shard, (last_modified, count) in stamps.items():
+        loc = escape(base_url + reverse('sitemap_products', args=[shard]))
+        yield f'<sitemap><loc>{loc}</loc><lastmod>{last_modified.isoformat()}</lastmod></sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def sitemap_pages(base_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for name in SITEMAP_PAGES:
+        yield f'<url><loc>{escape(base_url + reverse(name))}</loc></url>\n'
+    shop = base_url + reverse('shop')
+    for param, model in (('category', Category), ('brand', Brand)):
+        for slug, updated_at in model.objects.order_by('id').values_list('slug', 'updated_at'):
+            loc = escape(f'{shop}?{param}={slug}')
+            yield f'<url><loc>{loc}</loc><lastmod>{updated_at.isoformat()}</lastmod></url>\n'
+    yield '</urlset>\n'
+
+
+def render_sitemap_shard(base_url, shard):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    rows = shard_products(shard).values_list('slug', 'updated_at').iterator(chunk_size=CHUNK_SIZE)
+    url = product_url(base_url)
+    chunk = []
+    for slug, updated_at in rows:
+        loc = escape(url(slug))
+        chunk.append(f'<url><loc>{loc}</loc><lastmod>{updated_at.isoformat()}</lastmod></url>\n')
+        if len(chunk) >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('</urlset>\n')
+    yield ''.join(chunk)
+
+
+def sitemap_shard(base_url, shard):
+    """The shard's <urlset>, or None when the shard has no products."""
+    stamp = shard_stamps().get(shard)
+    if stamp is None:
+        return None
+    key = f'store:feeds:sitemap:{base_url}:{shard}:{_stamp_key(stamp)}'
+    return cached_stream(key, lambda: render_sitemap_shard(base_url, shard))
+
+
+# Merchant feed
+
+def feed_rows(base_url, shard):
+    products = (
+        shard_products(shard)
+        .select_related('category', 'brand')
+        .only('id', 'name', 'slug', 'description', 'image', 'stock_status', 'price', 'category__name', 'brand__name')
+    )
+    url = product_url(base_url)
+    for product in products.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': product.id,
+            'title': product.name,
+            'description': strip_tags(product.description or product.name)[:5000],
+            'link': url(product.slug),
+            'image_link': base_url + product.image.url if product.image else '',
+            'availability': AVAILABILITY[product.stock_status],
+            'price': f'{product.price:.2f} {CURRENCY}',
+            'brand': product.brand.name if product.brand else '',
+            'product_type': product.category.name if product.category else '',
+            'condition': 'new',
+        }
+
+
+def _batches(rows, render):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            yield render(chunk)
+            chunk = []
+    if chunk:
+        yield render(chunk)
+
+
+def _xml_item(row):
+    fields = ''.join(
+        f'<g:{column}>{escape(str(row[column]))}</g:{column}>' for column in FEED_COLUMNS if row[column] != ''
+    )
+    return f'<item>{fields}</item>\n'
+
+
+def _xml_items(rows):
+    return ''.join(_xml_item(row) for row in rows)
+
+
+def _csv_rows(rows):
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames=FEED_COLUMNS).writerows(rows)
+    return buffer.getvalue()
+
+
+FEED_FORMATS = {
+    # format: (content type, header, footer, renderer for a batch of rows)
+    'xml': (
+        'application/rss+xml; charset=utf-8',
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0"><channel>\n'
+        '<title>Boomerang Digital Solutions</title>\n',
+        '</channel></rss>\n',
+        _xml_items,
+    ),
+    'csv': ('text/csv; charset=utf-8', ','.join(FEED_COLUMNS) + '\r\n', '', _csv_rows),
+}
+
+
+def product_feed(base_url, fmt):
+    """
+    The whole catalogue as a merchant feed, stitched together from one
+    cached piece per shard; only shards whose products (or any category or
+    brand) changed since they were cached are rendered again.
+    """
+    content_type, header, footer, render = FEED_FORMATS[fmt]
+    taxonomy = taxonomy_stamp()
+    taxonomy = taxonomy.timestamp() if taxonomy else 0
+    yield header
+    for shard, stamp in shard_stamps().items():
+        key = f'store:feeds:{fmt}:{base_url}:{shard}:{_stamp_key(stamp)}:{taxonomy}'
+        yield from cached_stream(key, lambda shard=shard: _batches(feed_rows(base_url, shard), render))
+    yield footer
@@ -0,0 +1,115 @@
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Widths generated for each upload_to directory; anything else gets the defaults
+RENDITION_WIDTHS = {
+    'products': (320, 640, 960),
+    'brands': (120, 240),
+}
+DEFAULT_WIDTHS = (320, 640)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+# How long srcset() trusts a storage check that found no renditions; found
+# ones are recorded for good, since an image's name changes with its file
+MISSING_RENDITIONS_TIMEOUT = 60 * 10
+
+
+def widths_for(name):
+    return RENDITION_WIDTHS.get(posixpath.dirname(name).split('/')[0], DEFAULT_WIDTHS)
+
+
+def rendition_name(name, width, fmt):
+    """'products/phone.png' -> 'products/phone-320w.webp', next to the original."""
+    root, _ = posixpath.splitext(name)
+    return f'{root}-{width}w.{EXTENSIONS[fmt]}'
+
+
+def renditions_key(name):
+    return f'store:renditions:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def record_renditions(name):
+    cache.set(renditions_key(name), True, None)
+
+
+def has_renditions(name, storage):
+    """
+    Whether generate_renditions has written the renditions of ``name``. Read
+    from the cache it records them in, so pages don't ask the storage per
+    image; only an image the cache doesn't know about is checked there.
+    """
+    rendered = cache.get(renditions_key(name))
+    if rendered is None:
+        rendered = storage.exists(rendition_name(name, widths_for(name)[0], 'jpeg'))
+        cache.set(renditions_key(name), rendered, None if rendered else MISSING_RENDITIONS_TIMEOUT)
+    return rendered
+
+
+def render(image, width, fmt):
+    image = image.copy()
+    # thumbnail() never upscales, so small originals keep their own size
+    image.thumbnail((width, width * 4), Image.LANCZOS)
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    pillow_format, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def generate_renditions(name, storage=None, force=False):
+    """
+    Writes every missing rendition of the stored image ``name``. Returns the
+    number of files written, and records in the cache that they exist.
+    """
+    storage = storage or default_storage
+    targets = [
+        (width, fmt, rendition_name(name, width, fmt))
+        for width in widths_for(name)
+        for fmt in FORMATS
+    ]
+    if not force:
+        targets = [target for target in targets if not storage.exists(target[2])]
+    if not targets:
+        record_renditions(name)
+        return 0
+
+    with storage.open(name, 'rb') as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image.load()
+    for width, fmt, target in targets:
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(render(image, width, fmt)))
+    record_renditions(name)
+    return len(targets)
+
+
+def srcset(name, fmt, storage=None):
+    """
+    srcset value for the renditions of ``name``, or '' when they have not
+    been generated yet (the caller falls back to the original).
+    """
+    storage = storage or default_storage
+    if not has_renditions(name, storage):
+        return ''
+    return ', '.join(f'{storage.url(rendition_name(name, width, fmt))} {width}w' for width in widths_for(name))
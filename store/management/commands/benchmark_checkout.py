@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Product
+from store.orders import place_order
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Times order placement for growing cart sizes; nothing is left in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,10,25,50,100', help='Comma-separated cart sizes')
+        parser.add_argument('--repeat', type=int, default=20, help='Orders placed per cart size')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        customer = {
+            'customer_name': 'Benchmark',
+            'customer_phone': '0700000000',
+            'customer_address': 'Nairobi',
+            'payment_method': 'cod',
+        }
+
+        self.stdout.write(f"{'items':>6} {'queries':>8} {'median ms':>10} {'p95 ms':>8}")
+        try:
+            with transaction.atomic():
+                products = [
+                    Product(name=f'Benchmark product {i}', slug=f'benchmark-product-{i}', price=100 + i)
+                    for i in range(max(sizes))
+                ]
+                Product.objects.bulk_create(products)
+                product_ids = list(
+                    Product.objects.filter(slug__startswith='benchmark-product-').values_list('id', flat=True)
+                )
+
+                for size in sizes:
+                    cart = {str(product_id): 2 for product_id in product_ids[:size]}
+                    timings = []
+                    for _ in range(options['repeat']):
+                        with CaptureQueriesContext(connection) as queries:
+                            start = time.perf_counter()
+                            place_order(cart, customer)
+                            timings.append((time.perf_counter() - start) * 1000)
+                    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                    self.stdout.write(
+                        f'{size:>6} {len(queries):>8} {statistics.median(timings):>10.2f} {p95:>8.2f}'
+                    )
+                raise Rollback
+        except Rollback:
+            pass
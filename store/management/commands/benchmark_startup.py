@@ -0,0 +1,81 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.benchmarks import route_targets
+
+# Run in a fresh interpreter per measurement, so nothing is imported,
+# compiled or cached beforehand
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+imported = time.perf_counter()
+warmup = 0.0
+if sys.argv[3] == 'warm':
+    from store.warmup import warm_up
+    warmup = sum(ms for ms, items in warm_up().values())
+from django.test import Client
+client = Client(HTTP_HOST=sys.argv[2])
+timings = []
+for _ in range(2):
+    request_start = time.perf_counter()
+    status = client.get(sys.argv[1]).status_code
+    timings.append((time.perf_counter() - request_start) * 1000)
+print('PROBE ' + json.dumps({
+    'import': (imported - start) * 1000, 'warmup': warmup, 'first': timings[0], 'second': timings[1], 'status': status,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures worker start-up: Django import time and first- vs second-request latency per route, '
+        'each in a fresh interpreter, with and without the warm-up gunicorn runs before forking'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per route and mode (median reported)')
+        parser.add_argument('--routes', default='home,shop,product_detail', help='Comma-separated route names')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS')
+
+    def handle(self, *args, **options):
+        targets = dict(route_targets())
+        routes = options['routes'].split(',')
+        unknown = [name for name in routes if not targets.get(name)]
+        if unknown:
+            raise CommandError(f"No path to time for: {', '.join(unknown)}")
+
+        self.stdout.write(
+            f"{'route':<20} {'mode':<5} {'process ms':>10} {'import ms':>10} {'warmup ms':>10} "
+            f"{'first ms':>9} {'second ms':>10}"
+        )
+        for name in routes:
+            for mode in ('cold', 'warm'):
+                runs = [self.probe(targets[name], options['host'], mode) for _ in range(options['runs'])]
+                row = {key: statistics.median(run[key] for run in runs) for key in runs[0] if key != 'status'}
+                self.stdout.write(
+                    f"{name:<20} {mode:<5} {row['process']:>10.1f} {row['import']:>10.1f} {row['warmup']:>10.1f} "
+                    f"{row['first']:>9.1f} {row['second']:>10.1f}"
+                )
+
+    def probe(self, path, host, mode):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, path, host, mode],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        lines = [line for line in result.stdout.splitlines() if line.startswith('PROBE ')]
+        if result.returncode or not lines:
+            raise CommandError(f'Probe for {path} failed:\n{result.stderr}')
+        run = json.loads(lines[-1][len('PROBE '):])
+        # Interpreter start to exit, as a new worker would see it
+        run['process'] = elapsed
+        return run
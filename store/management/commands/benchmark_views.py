@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from store.benchmarks import benchmark, fill_cart, measure, route_targets
+
+
+class Command(BaseCommand):
+    help = 'Times every store route with the test client and reports latency percentiles and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per route')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route first')
+        parser.add_argument('--routes', help='Comma-separated route names to run (default: all)')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS')
+        parser.add_argument('--empty-cart', action='store_true', help="Don't put a product in the cart first")
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=options['host'])
+        if not options['empty_cart']:
+            fill_cart(client)
+        only = set(options['routes'].split(',')) if options['routes'] else None
+
+        self.stdout.write(
+            f"{'route':<20} {'status':>7} {'cold ms':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'queries':>8}"
+        )
+        for name, path in route_targets():
+            if only and name not in only:
+                continue
+            if path is None:
+                self.stdout.write(f'{name:<20} skipped, no sample row for its URL arguments')
+                continue
+            status, cold, cold_queries = measure(client, path)
+            row = benchmark(client, path, options['requests'], options['warmup'])
+            self.stdout.write(
+                f"{name:<20} {row['status']:>7} {cold:>8.1f} {row['p50']:>8.1f} {row['p95']:>8.1f} "
+                f"{row['p99']:>8.1f} {row['max']:>8.1f} {row['queries']:>3} ({cold_queries})"
+            )
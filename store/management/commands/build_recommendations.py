@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds "frequently bought together" recommendations from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=4, help='Neighbours kept per product')
+
+    def handle(self, *args, **options):
+        count = build_recommendations(k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {count} recommendations'))
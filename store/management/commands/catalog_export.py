@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.catalog import COLUMNS, MODELS, detect_format, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Streams categories, brands or products out as CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), default='products')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the output extension, else csv')
+        parser.add_argument('--output', '-o', default='-', help="File to write, or '-' for stdout")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('csv' if output == '-' else detect_format(output))
+        rows = export_rows(options['model'])
+        if output == '-':
+            write_rows(sys.stdout, fmt, COLUMNS[options['model']], rows)
+        else:
+            with open(output, 'w', newline='', encoding='utf-8') as stream:
+                write_rows(stream, fmt, COLUMNS[options['model']], rows)
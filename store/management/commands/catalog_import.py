@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog import MODELS, CatalogImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Streams categories, brands or products from CSV/JSONL into the catalog, upserting on slug'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or '-' for stdin")
+        parser.add_argument('--model', choices=sorted(MODELS), default='products')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path == '-' else detect_format(path))
+
+        def progress(importer):
+            self.stdout.write(
+                f'{importer.created + importer.updated} rows '
+                f'({importer.created} created, {importer.updated} updated, {len(importer.errors)} skipped)'
+            )
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with stream:
+            importer = CatalogImporter(options['model'], chunk_size=options['chunk_size'])
+            importer.run(read_rows(stream, fmt), progress=progress)
+
+        for number, error in importer.errors:
+            self.stderr.write(f'Row {number}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {options["model"]}: {importer.created} created, {importer.updated} updated, '
+            f'{len(importer.errors)} skipped'
+        ))
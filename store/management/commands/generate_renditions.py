@@ -0,0 +1,66 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.cache import bump_catalog_version
+from store.images import generate_renditions, record_renditions
+from store.models import Brand, Product
+
+
+def render_one(args):
+    name, force = args
+    try:
+        return name, generate_renditions(name, force=force), None
+    except Exception as e:
+        return name, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Generates resized WebP/JPEG renditions for product images and brand logos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Regenerate renditions that already exist')
+
+    def handle(self, *args, **options):
+        # Several products (or a product and a brand) can share one image
+        products, brands = defaultdict(list), defaultdict(list)
+        for name, id in Product.objects.exclude(image='').exclude(image=None).values_list('image', 'id'):
+            products[name].append(id)
+        for name, id in Brand.objects.exclude(logo='').exclude(logo=None).values_list('logo', 'id'):
+            brands[name].append(id)
+        jobs = [(name, options['force']) for name in {*products, *brands}]
+
+        written = errors = 0
+        touched_products, touched_brands = [], []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for done, (name, count, error) in enumerate(pool.map(render_one, jobs, chunksize=8), 1):
+                if error:
+                    errors += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                # The workers' record only reaches this site's cache if it's shared
+                record_renditions(name)
+                if count:
+                    written += count
+                    touched_products += products.get(name, [])
+                    touched_brands += brands.get(name, [])
+                if done % 100 == 0:
+                    self.stdout.write(f'{done}/{len(jobs)} images')
+
+        # New renditions change the markup, so move updated_at on to expire
+        # the cached fragments and ETags that embed these images. update()
+        # sends no save signals, so the catalogue version (and with it the
+        # page cache) is moved on here, once for the batch.
+        if touched_products or touched_brands:
+            now = timezone.now()
+            Product.objects.filter(id__in=touched_products).update(updated_at=now)
+            Brand.objects.filter(id__in=touched_brands).update(updated_at=now)
+            bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(jobs)} images, {written} renditions written, {errors} errors'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store.search import get_order_search_backend, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product full-text and order lookup search indexes from scratch'
+
+    def handle(self, *args, **options):
+        get_search_backend().rebuild()
+        get_order_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
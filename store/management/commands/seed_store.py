@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with a synthetic catalogue and order history for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--max-items', type=int, default=4, help='Most distinct products in one order')
+        parser.add_argument('--days', type=int, default=365, help='How far back order history goes')
+        parser.add_argument('--seed', type=int, help='Random seed, for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        seeder = Seeder(
+            seed=options['seed'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            progress=lambda message: self.stdout.write(f'  {message} ({time.perf_counter() - start:.0f}s)'),
+        )
+        products = seeder.seed_products(options['products'])
+        orders = seeder.seed_orders(options['orders'], max_items=options['max_items'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {products} products and {orders} orders in {time.perf_counter() - start:.1f}s. '
+            'Run update_sales_rollups and build_recommendations to refresh derived tables.'
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.outbox import MailServerUnavailable, requeue_failed, retry_delay, send_pending
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Queue emails that ran out of attempts again first')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f'Requeued {requeue_failed()} failed emails')
+        outages = 0
+        while True:
+            try:
+                sent, failed = send_pending(options['batch_size'])
+            except MailServerUnavailable as e:
+                # Nothing was sent, so don't move on to the next batch: wait,
+                # longer the longer the server stays down
+                if not options['loop']:
+                    raise CommandError(f'Could not connect to the mail server: {e}')
+                outages += 1
+                self.stderr.write(f'Mail server unavailable: {e}')
+                time.sleep(retry_delay(outages).total_seconds())
+                continue
+            outages = 0
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+            # A full batch usually means more are waiting
+            if sent + failed >= options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.rollups import refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Brings the daily sales rollups up to date with orders changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day from scratch')
+
+    def handle(self, *args, **options):
+        days = refresh_sales_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {days} day(s) of sales rollups'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Compiles the store templates and primes the navigation, settings and typeahead caches. '
+        'Gunicorn runs the same warm-up in its master before forking (config/gunicorn.py); run it '
+        'by hand to check it, or after a deploy to refill a shared cache.'
+    )
+
+    def handle(self, *args, **options):
+        timings = warm_up()
+        for name, (elapsed, items) in timings.items():
+            self.stdout.write(f'{name:<12} {elapsed:>8.1f} ms  {items:>6} items')
+        self.stdout.write(self.style.SUCCESS(f'Warmed up in {sum(ms for ms, items in timings.values()):.1f} ms'))
@@ -0,0 +1,341 @@
+import functools
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import parse_http_date_safe
+
+from .cache import page_cache_key
+from .routers import replica_alias, use_primary
+
+logger = logging.getLogger('store.performance')
+
+# Overridable from settings
+SLOW_QUERY_MS = 100
+REPEATED_QUERY_THRESHOLD = 5
+READ_REPLICA_PIN_SECONDS = 10
+PAGE_CACHE_TIMEOUT = 60 * 10
+PAGE_CACHE_MAX_AGE = 60
+
+# Catalogue and information pages: the same for every anonymous visitor once
+# the cart badge is fetched separately (views.cart_badge)
+CACHED_PAGES = {'home', 'shop', 'product_detail', 'about', 'contact', 'privacy', 'terms', 'warranty'}
+
+PRIMARY_COOKIE = 'store_primary'
+
+_metrics = ContextVar('store_request_metrics', default=None)
+_MISS = object()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = []
+        self.template_ms = 0.0
+        self.cache_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record_query(self, sql, duration):
+        self.queries.append((sql, duration))
+
+    @property
+    def db_ms(self):
+        return sum(duration for sql, duration in self.queries)
+
+    def slow_queries(self, threshold_ms):
+        return [(sql, duration) for sql, duration in self.queries if duration >= threshold_ms]
+
+    def repeated_queries(self, threshold):
+        # The same SQL text with different parameters, run over and over, is
+        # the usual shape of an N+1 loop
+        counts = Counter(sql for sql, duration in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+
+def _timed_execute(execute, sql, params, many, context):
+    # Installed on every connection; the context variable carries over into
+    # sync_to_async threads, so async views are measured too
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, (time.perf_counter() - start) * 1000)
+
+
+def _instrument_connection(connection, **kwargs):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        metrics = _metrics.get()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_ms += (time.perf_counter() - start) * 1000
+    wrapper.store_instrumented = True
+    return wrapper
+
+
+def _counted_get(get):
+    @functools.wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        metrics = _metrics.get()
+        if metrics is None:
+            return get(self, key, default, version)
+        start = time.perf_counter()
+        value = get(self, key, _MISS, version)
+        metrics.cache_ms += (time.perf_counter() - start) * 1000
+        if value is _MISS:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+    wrapper.store_instrumented = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @functools.wraps(get_many)
+    def wrapper(self, keys, version=None):
+        metrics = _metrics.get()
+        if metrics is None:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        start = time.perf_counter()
+        values = get_many(self, keys, version)
+        metrics.cache_ms += (time.perf_counter() - start) * 1000
+        metrics.cache_hits += len(values)
+        metrics.cache_misses += len(keys) - len(values)
+        return values
+    wrapper.store_instrumented = True
+    return wrapper
+
+
+def install_instrumentation():
+    """
+    Wraps database connections, template rendering and the configured cache
+    backends so they report into the current request's metrics. Called from
+    StoreConfig.ready() when PerformanceMiddleware is installed. Idempotent;
+    outside a request the wrappers only cost a context variable lookup.
+    """
+    connection_created.connect(_instrument_connection, dispatch_uid='store_performance')
+    for connection in connections.all(initialized_only=True):
+        _instrument_connection(connection)
+    if not getattr(Template.render, 'store_instrumented', False):
+        Template.render = _timed_render(Template.render)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if not getattr(backend.get, 'store_instrumented', False):
+            backend.get = _counted_get(backend.get)
+        if not getattr(backend.get_many, 'store_instrumented', False):
+            backend.get_many = _counted_get_many(backend.get_many)
+
+
+class PerformanceMiddleware:
+    """
+    Records database, template and cache work for each request and reports it
+    as a Server-Timing header (for staff, or everyone under DEBUG) and as one
+    JSON log line on the ``store.performance`` logger. Slow queries and SQL
+    repeated within a request (likely N+1s) are logged as warnings.
+
+    Listed first in MIDDLEWARE so the total covers the whole stack. Template
+    time includes any queries the template triggers, so the parts can add up
+    to more than the total.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_query_ms = getattr(settings, 'SLOW_QUERY_MS', SLOW_QUERY_MS)
+        self.repeated_query_threshold = getattr(settings, 'REPEATED_QUERY_THRESHOLD', REPEATED_QUERY_THRESHOLD)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        self.report(request, response, metrics, (time.perf_counter() - start) * 1000)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        # report() may load request.user from the database
+        await sync_to_async(self.report)(request, response, metrics, (time.perf_counter() - start) * 1000)
+        return response
+
+    def report(self, request, response, metrics, total_ms):
+        url_name = request.resolver_match.view_name if request.resolver_match else None
+        slow = metrics.slow_queries(self.slow_query_ms)
+        repeated = metrics.repeated_queries(self.repeated_query_threshold)
+
+        for sql, duration in slow:
+            logger.warning('Slow query (%.1f ms) in %s: %s', duration, url_name or request.path, sql)
+        for sql, count in repeated:
+            logger.warning('Query repeated %d times in %s (N+1?): %s', count, url_name or request.path, sql)
+
+        logger.info(json.dumps({
+            'url_name': url_name,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(metrics.db_ms, 2),
+            'queries': len(metrics.queries),
+            'slow_queries': len(slow),
+            'repeated_queries': len(repeated),
+            'template_ms': round(metrics.template_ms, 2),
+            'cache_ms': round(metrics.cache_ms, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+        }))
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            db_desc = f'{len(metrics.queries)} queries'
+            if slow:
+                db_desc += f', {len(slow)} slow'
+            if repeated:
+                db_desc += f', {len(repeated)} repeated'
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={metrics.db_ms:.1f};desc="{db_desc}"',
+                f'tpl;dur={metrics.template_ms:.1f};desc="Templates"',
+                f'cache;dur={metrics.cache_ms:.1f};desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+                f'total;dur={total_ms:.1f};desc="{url_name or "unresolved"}"',
+            ])
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pins requests that write (any non-safe method) to the primary database,
+    and sets a short-lived cookie so the pages the client goes on to load,
+    such as the one a form redirects to, are read from the primary too
+    until the replica has caught up. Does nothing without a read replica.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'READ_REPLICA_PIN_SECONDS', READ_REPLICA_PIN_SECONDS)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        writes = self.writes(request)
+        with self.routing(request, writes):
+            response = self.get_response(request)
+        return self.process_response(response, writes)
+
+    async def __acall__(self, request):
+        writes = self.writes(request)
+        with self.routing(request, writes):
+            response = await self.get_response(request)
+        return self.process_response(response, writes)
+
+    def writes(self, request):
+        return bool(replica_alias()) and request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def routing(self, request, writes):
+        if writes or (replica_alias() and PRIMARY_COOKIE in request.COOKIES):
+            return use_primary()
+        return nullcontext()
+
+    def process_response(self, response, writes):
+        if writes:
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=self.pin_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class PageCacheMiddleware(MiddlewareMixin):
+    """
+    Serves CACHED_PAGES to anonymous visitors from the shared cache, keyed on
+    the URL and the catalogue version (store.cache.page_cache_key), so pages
+    drop out of it as soon as the catalogue changes. Signed-in users and
+    visitors with a flash message waiting get the view, marked private.
+
+    Listed before the session and CSRF middleware, so a response that would
+    set a cookie is seen as such and never stored. Off unless
+    PAGE_CACHE_ENABLED, which settings tie to the shared (Redis) cache.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PAGE_CACHE_ENABLED', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.timeout = getattr(settings, 'PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT)
+        self.max_age = getattr(settings, 'PAGE_CACHE_MAX_AGE', PAGE_CACHE_MAX_AGE)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != 'GET' or request.resolver_match.url_name not in CACHED_PAGES:
+            return None
+        if request.user.is_authenticated or len(messages.get_messages(request)):
+            request._page_cache = None
+            return None
+        request._page_cache = page_cache_key(request)
+        response = cache.get(request._page_cache)
+        if response is None:
+            return None
+        request._page_cache_hit = True
+        # A hit still answers conditional requests
+        response = get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+            response=response,
+        )
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def process_response(self, request, response):
+        key = getattr(request, '_page_cache', False)
+        if key is False or getattr(request, '_page_cache_hit', False):
+            return response
+        # Signed-in and anonymous visitors get different pages at the same URL
+        patch_vary_headers(response, ('Cookie',))
+        if key is None:
+            patch_cache_control(response, private=True)
+        elif response.status_code == 200 and not response.streaming and not response.cookies:
+            patch_cache_control(response, public=True, max_age=self.max_age)
+            cache.set(key, response, self.timeout)
+            response['X-Cache'] = 'MISS'
+        return response
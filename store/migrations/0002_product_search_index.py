@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+# The index as store.search built it when this migration was written; kept
+# here so later changes to store.search don't change what this migration does
+VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(name::text, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description::text, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(specifications::text, '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE store_product ADD COLUMN search_vector tsvector')
+        schema_editor.execute(
+            'CREATE INDEX store_product_search_vector_gin ON store_product USING GIN (search_vector)'
+        )
+        schema_editor.execute(f'UPDATE store_product SET search_vector = {VECTOR_SQL}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE store_product_fts USING fts5(name, description, specifications)'
+        )
+        schema_editor.execute(
+            'INSERT INTO store_product_fts (rowid, name, description, specifications) '
+            "SELECT id, name, coalesce(description, ''), coalesce(specifications, '') FROM store_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS store_product_search_vector_gin')
+        schema_editor.execute('ALTER TABLE store_product DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS store_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,140 @@
+import json
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+# store.specs as of this migration, frozen so later changes there don't
+# change what this migration does
+
+FREE_TEXT_NAME = 'Features'
+
+_SEPARATOR = re.compile(r'\s*(?::|\t)\s*')
+
+
+def _text(value):
+    if isinstance(value, (list, tuple)):
+        return ', '.join(_text(item) for item in value)
+    return '' if value is None else str(value).strip()
+
+
+def parse_specifications(value):
+    if isinstance(value, dict):
+        specs = {_text(name): _text(item) for name, item in value.items()}
+        return {name: item for name, item in specs.items() if name and item}
+
+    text = _text(value)
+    if not text:
+        return {}
+    if text.startswith('{'):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return parse_specifications(data)
+
+    specs, free_text = {}, []
+    for line in text.splitlines():
+        line = line.strip().lstrip('-*•').strip()
+        if not line:
+            continue
+        parts = _SEPARATOR.split(line, maxsplit=1)
+        if len(parts) == 2 and parts[0] and parts[1] and len(parts[0]) <= 50:
+            specs[parts[0]] = parts[1]
+        else:
+            free_text.append(line)
+    if free_text:
+        specs[FREE_TEXT_NAME] = '\n'.join(free_text)
+    return specs
+
+
+def attribute_rows(ProductAttribute, product_id, specifications):
+    rows = {}
+    for name, value in parse_specifications(specifications).items():
+        key, value = slugify(name)[:100], _text(value)
+        if key and value and len(name) <= 100 and len(value) <= 255 and '\n' not in value:
+            rows.setdefault(key, ProductAttribute(product_id=product_id, key=key, name=name, value=value))
+    return rows.values()
+
+
+def parse_text_specifications(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductAttribute = apps.get_model('store', 'ProductAttribute')
+    products = Product.objects.exclude(specifications__isnull=True).exclude(specifications='').only('id', 'specifications')
+    batch = []
+    for product in products.iterator(chunk_size=1000):
+        product.structured_specifications = parse_specifications(product.specifications)
+        batch.append(product)
+        if len(batch) >= 1000:
+            save_batch(Product, ProductAttribute, batch)
+            batch = []
+    if batch:
+        save_batch(Product, ProductAttribute, batch)
+
+
+def save_batch(Product, ProductAttribute, products):
+    Product.objects.bulk_update(products, ['structured_specifications'])
+    ProductAttribute.objects.bulk_create([
+        row
+        for product in products
+        for row in attribute_rows(ProductAttribute, product.id, product.structured_specifications)
+    ])
+
+
+def specifications_to_text(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    products = []
+    for product in Product.objects.exclude(structured_specifications={}).only('id', 'structured_specifications'):
+        product.specifications = '\n'.join(
+            f'{name}: {value}' for name, value in product.structured_specifications.items()
+        )
+        products.append(product)
+    Product.objects.bulk_update(products, ['specifications'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAttribute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.SlugField(db_index=False, max_length=100)),
+                ('name', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attributes', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'value', 'product'], name='product_attribute_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'key'), name='unique_product_attribute')],
+            },
+        ),
+        # The text can't be cast in place (most of it isn't JSON), so parse it
+        # into a new column and swap the columns over.
+        migrations.AddField(
+            model_name='product',
+            name='structured_specifications',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(parse_text_specifications, specifications_to_text),
+        migrations.RemoveField(
+            model_name='product',
+            name='specifications',
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='structured_specifications',
+            new_name='specifications',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='specifications',
+            field=models.JSONField(blank=True, default=dict, help_text='{"RAM": "16GB", "Storage": "512GB SSD"}'),
+        ),
+    ]
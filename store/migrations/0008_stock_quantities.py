@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+def quantities_from_status(apps, schema_editor):
+    # Nothing says how many in-stock products are on hand, so they start
+    # untracked (NULL) and keep selling until the admin enters a count
+    Product = apps.get_model('store', 'Product')
+    Product.objects.filter(stock_status='out_of_stock').update(stock_quantity=0)
+    Product.objects.filter(stock_status='pre_order').update(stock_quantity=0, allow_preorder=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_structured_specifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='allow_preorder',
+            field=models.BooleanField(default=False, help_text='Keep selling as Pre-Order once none are on hand'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_quantity',
+            field=models.PositiveIntegerField(blank=True, help_text='Units on hand, taken off at checkout. Leave empty to sell without tracking stock.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='stock_status',
+            field=models.CharField(choices=[('in_stock', 'In Stock'), ('out_of_stock', 'Out of Stock'), ('pre_order', 'Pre-Order')], default='in_stock', editable=False, max_length=20),
+        ),
+        migrations.RunPython(quantities_from_status, migrations.RunPython.noop),
+    ]
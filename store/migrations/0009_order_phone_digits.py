@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:07
+
+import re
+
+from django.db import migrations, models
+
+
+def normalize_phone(phone):
+    # Order.normalize_phone when this migration was written
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    if phone.startswith('+') or (digits.startswith('254') and len(digits) >= 12):
+        return digits.removeprefix('254')
+    return digits.removeprefix('0')
+
+
+def fill_phone_digits(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    batch = []
+    for order in Order.objects.only('id', 'customer_phone').iterator(chunk_size=2000):
+        order.phone_digits = normalize_phone(order.customer_phone)
+        batch.append(order)
+        if len(batch) >= 2000:
+            Order.objects.bulk_update(batch, ['phone_digits'])
+            batch = []
+    Order.objects.bulk_update(batch, ['phone_digits'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_stock_quantities'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='phone_digits',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+    ]
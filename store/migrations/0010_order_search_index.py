@@ -0,0 +1,47 @@
+from django.db import migrations
+
+TRIGRAM_COLUMNS = ('order_number', 'customer_name', 'customer_email', 'phone_digits')
+
+
+def create_order_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # Needs a role allowed to create extensions (or pg_trgm created beforehand)
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in TRIGRAM_COLUMNS:
+            # CONCURRENTLY keeps checkout writing to store_order while the index builds
+            schema_editor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS store_order_{column}_trgm '
+                f'ON store_order USING GIN ({column} gin_trgm_ops)'
+            )
+        return
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE store_order_fts USING fts5('
+            "order_number, customer_name, customer_email, phone_digits, tokenize='trigram')"
+        )
+        schema_editor.execute(
+            'INSERT INTO store_order_fts (rowid, order_number, customer_name, customer_email, phone_digits) '
+            'SELECT id, order_number, customer_name, customer_email, phone_digits FROM store_order'
+        )
+
+
+def drop_order_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for column in TRIGRAM_COLUMNS:
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS store_order_{column}_trgm')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS store_order_fts')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('store', '0009_order_phone_digits'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_order_search_index, drop_order_search_index),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# store.specs.RESERVED_PARAMS and RESERVED_SUFFIX when this was written
+RESERVED_PARAMS = ('q', 'category', 'brand', 'stock', 'min_price', 'max_price', 'sort', 'page', 'cursor')
+RESERVED_SUFFIX = '-spec'
+
+
+def rekey_reserved_attributes(apps, schema_editor):
+    # Attributes keyed like a shop parameter could never be filtered on
+    ProductAttribute = apps.get_model('store', 'ProductAttribute')
+    for key in RESERVED_PARAMS:
+        new_key = f'{key}{RESERVED_SUFFIX}'
+        taken = ProductAttribute.objects.filter(key=new_key).values('product_id')
+        ProductAttribute.objects.filter(key=key).exclude(product_id__in=taken).update(key=new_key)
+        ProductAttribute.objects.filter(key=key).delete()
+
+
+def restore_reserved_keys(apps, schema_editor):
+    ProductAttribute = apps.get_model('store', 'ProductAttribute')
+    for key in RESERVED_PARAMS:
+        ProductAttribute.objects.filter(key=f'{key}{RESERVED_SUFFIX}').update(key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_order_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_reserved_attributes, restore_reserved_keys),
+    ]
@@ -1,4 +1,7 @@
+import re
+
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 
 class Category(models.Model):
@@ -44,24 +47,76 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True, blank=True)
     description = models.TextField(blank=True, null=True)
-    specifications = models.TextField(blank=True, null=True, help_text="JSON or formatted text for specs")
+    specifications = models.JSONField(default=dict, blank=True, help_text='{"RAM": "16GB", "Storage": "512GB SSD"}')
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='products')
     brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, related_name='products')
     image = models.ImageField(upload_to='products/', blank=True, null=True)
-    stock_status = models.CharField(max_length=20, choices=STOCK_STATUS_CHOICES, default='in_stock')
+    stock_quantity = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text='Units on hand, taken off at checkout. Leave empty to sell without tracking stock.',
+    )
+    allow_preorder = models.BooleanField(default=False, help_text='Keep selling as Pre-Order once none are on hand')
+    # Derived from stock_quantity and allow_preorder on save (and by the
+    # checkout's stock UPDATE); stored so the shop can filter and index on it
+    stock_status = models.CharField(max_length=20, choices=STOCK_STATUS_CHOICES, default='in_stock', editable=False)
     is_featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Listing indexes for shop(): one per sort order (ending in id so
+        # keyset cursors can seek on them) and one per filter + default sort
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_newest_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_newest_idx'),
+            models.Index(fields=['brand', '-created_at', '-id'], name='product_brand_newest_idx'),
+            models.Index(fields=['stock_status', '-created_at', '-id'], name='product_stock_newest_idx'),
+            models.Index(fields=['is_featured', 'stock_status'], name='product_featured_idx'),
+        ]
+
+    @staticmethod
+    def stock_status_for(quantity, allow_preorder):
+        if quantity is None or quantity > 0:
+            return 'in_stock'
+        return 'pre_order' if allow_preorder else 'out_of_stock'
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.stock_status = self.stock_status_for(self.stock_quantity, self.allow_preorder)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'stock_quantity', 'allow_preorder'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'stock_status'}
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
+class ProductAttribute(models.Model):
+    """
+    One row per entry in Product.specifications, keyed by the slugified
+    name. Maintained by store.specs.index_attributes and used for the shop's
+    attribute filters.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attributes')
+    key = models.SlugField(max_length=100, db_index=False)
+    name = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'value', 'product'], name='product_attribute_lookup_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'key'], name='unique_product_attribute'),
+        ]
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -76,6 +131,8 @@ class Order(models.Model):
     customer_name = models.CharField(max_length=255)
     customer_email = models.EmailField(max_length=255)
     customer_phone = models.CharField(max_length=20)
+    # customer_phone as its national number, kept for order search (store.search)
+    phone_digits = models.CharField(max_length=20, blank=True, editable=False)
     customer_address = models.TextField()
     payment_method = models.CharField(max_length=50, default='whatsapp', choices=[
         ('mpesa', 'M-Pesa (Manual)'),
@@ -88,6 +145,32 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Sales rollups: find changed orders, then re-read whole days
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+        ]
+
+    # Numbers are entered as 0712..., 254712... or +254 712...
+    PHONE_COUNTRY_CODE = '254'
+
+    @classmethod
+    def normalize_phone(cls, phone):
+        """'+254 712-345 678', '254712345678' and '0712 345678' -> '712345678'"""
+        phone = (phone or '').strip()
+        digits = re.sub(r'\D', '', phone)
+        if phone.startswith('+') or (digits.startswith(cls.PHONE_COUNTRY_CODE) and len(digits) >= 12):
+            return digits.removeprefix(cls.PHONE_COUNTRY_CODE)
+        return digits.removeprefix('0')
+
+    def save(self, *args, **kwargs):
+        self.phone_digits = self.normalize_phone(self.customer_phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'customer_phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_digits'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Order #{self.order_number}"
 
@@ -110,3 +193,109 @@ class SiteSetting(models.Model):
 
     def __str__(self):
         return self.setting_key
+
+class OutboxEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    bcc = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+class ProductRecommendation(models.Model):
+    """
+    Precomputed "frequently bought together" neighbours, rebuilt by the
+    build_recommendations command.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_by')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} -> {self.recommended}"
+
+class DailySales(models.Model):
+    """
+    One row per day of orders, maintained by update_sales_rollups.
+    Cancelled orders are left out of the totals (see DailyStatusSales).
+    """
+    date = models.DateField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'sales dashboard'
+        verbose_name_plural = 'sales dashboard'
+
+    def __str__(self):
+        return str(self.date)
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='+')
+    product_name = models.CharField(max_length=255)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, related_name='+')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='daily_product_sales_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_name}"
+
+class DailyStatusSales(models.Model):
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='unique_daily_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}"
+
+class RollupCheckpoint(models.Model):
+    """High-water mark on Order.updated_at for an incremental rollup job."""
+    name = models.CharField(max_length=50, unique=True)
+    high_water_mark = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,109 @@
+import uuid
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest, Now
+
+from .cache import bump_catalog_version
+from .models import Order, OrderItem, Product
+from .utils import send_order_email
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def generate_order_number():
+    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
+
+def reserve_stock(product, quantity):
+    """
+    Takes ``quantity`` off a tracked product with one conditional UPDATE,
+    so concurrent checkouts can't sell the same unit twice: the row lock
+    makes the second one re-check the WHERE against the first one's
+    result. Pre-order products keep selling once none are left. The derived
+    stock_status (and updated_at, which keys the cached fragments) change
+    in the same statement when the product runs out.
+    """
+    runs_out = Q(stock_quantity__lte=quantity) & Q(stock_quantity__gt=0)
+    return Product.objects.filter(
+        Q(stock_quantity__gte=quantity) | Q(allow_preorder=True),
+        id=product.id,
+        stock_quantity__isnull=False,
+    ).update(
+        stock_quantity=Greatest(F('stock_quantity') - quantity, Value(0)),
+        stock_status=Case(
+            When(stock_quantity__gt=quantity, then=Value('in_stock')),
+            When(allow_preorder=True, then=Value('pre_order')),
+            default=Value('out_of_stock'),
+        ),
+        updated_at=Case(When(runs_out, then=Now()), default=F('updated_at')),
+    )
+
+
+def place_order(cart, customer):
+    """
+    Turns cart quantities ({product_id: n}) into an Order in a
+    single transaction. Prices are re-read in one query rather than trusted
+    from the cart, stock is reserved line by line (see reserve_stock), items
+    are written with one bulk INSERT, and the confirmation email is queued
+    in the outbox alongside the order.
+
+    ``customer`` holds the Order's customer_* fields plus payment_method and
+    notes.
+    """
+    quantities = {}
+    for product_id, quantity in cart.items():
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if quantity > 0:
+            quantities[str(product_id)] = quantity
+
+    with transaction.atomic():
+        # In id order, so concurrent checkouts lock rows in the same order
+        products = (
+            Product.objects.filter(id__in=quantities.keys())
+            .only('id', 'name', 'price', 'stock_quantity', 'stock_status')
+            .order_by('id')
+        )
+        lines = [(product, quantities[str(product.id)]) for product in products]
+        if not lines:
+            raise CheckoutError('Your cart is empty')
+
+        tracked = [(product, quantity) for product, quantity in lines if product.stock_quantity is not None]
+        for product, quantity in tracked:
+            if not reserve_stock(product, quantity):
+                left = Product.objects.filter(id=product.id).values_list('stock_quantity', flat=True).first()
+                if not left:
+                    raise CheckoutError(f'Sorry, {product.name} is out of stock')
+                raise CheckoutError(f'Sorry, only {left} of {product.name} left in stock')
+        if tracked:
+            statuses = dict(Product.objects.filter(id__in=[p.id for p, q in tracked]).values_list('id', 'stock_status'))
+            if any(statuses[product.id] != product.stock_status for product, quantity in tracked):
+                # Listings, facets and product pages show the new status
+                transaction.on_commit(bump_catalog_version)
+
+        order = Order.objects.create(
+            order_number=generate_order_number(),
+            total_amount=sum(product.price * quantity for product, quantity in lines),
+            status='pending',
+            **customer,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=product,
+                product_name=product.name,
+                product_price=product.price,
+                quantity=quantity,
+                subtotal=product.price * quantity,
+            )
+            for product, quantity in lines
+        ])
+        # Queued in the same transaction, so the email exists if and only if the order does
+        send_order_email(order)
+
+    return order
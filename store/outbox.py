@@ -0,0 +1,133 @@
+import logging
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+# 1, 2, 4 ... 32 minutes, then hourly: about a day of retries before giving
+# up, so an SMTP outage doesn't lose the order emails queued during it
+MAX_ATTEMPTS = 30
+# How long claimed emails are kept from other workers while being sent
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class MailServerUnavailable(Exception):
+    """No mail connection could be opened; the claimed batch was put back."""
+
+
+def retry_delay(attempts):
+    # 1, 2, 4, 8... minutes between attempts, capped at RETRY_MAX_DELAY
+    return min(RETRY_BASE_DELAY * 2 ** min(attempts - 1, 16), RETRY_MAX_DELAY)
+
+
+def build_message(email, mail_connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        bcc=email.bcc,
+        connection=mail_connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def claim_due(batch_size):
+    """
+    Takes up to ``batch_size`` due emails and commits at once, counting the
+    attempt and pushing next_attempt_at past CLAIM_TIMEOUT, so no other
+    worker picks them up while they are sent outside the transaction. If a
+    worker dies mid-batch, its emails come due again once the claim lapses.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            # Lets several workers drain the outbox without double-sending
+            due = due.select_for_update(skip_locked=True)
+        emails = list(due[:batch_size])
+        for email in emails:
+            email.attempts += 1
+            email.next_attempt_at = now + CLAIM_TIMEOUT
+        OutboxEmail.objects.bulk_update(emails, ['attempts', 'next_attempt_at'])
+    return emails
+
+
+def record_failure(email, error):
+    email.last_error = str(error)
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'failed'
+        logger.error('Giving up on outbox email %s: %s', email.pk, error)
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        logger.warning('Outbox email %s failed (attempt %s): %s', email.pk, email.attempts, error)
+
+
+def release(emails, error):
+    """
+    Puts back a claimed batch that was never tried: the attempt the claim
+    counted is undone and the emails come due again after RETRY_BASE_DELAY.
+    """
+    next_attempt_at = timezone.now() + RETRY_BASE_DELAY
+    for email in emails:
+        email.attempts -= 1
+        email.next_attempt_at = next_attempt_at
+        email.last_error = str(error)
+    OutboxEmail.objects.bulk_update(emails, ['attempts', 'next_attempt_at', 'last_error'])
+
+
+def send_pending(batch_size=50):
+    """
+    Sends up to ``batch_size`` due outbox emails over a single mail
+    connection. Failed sends are rescheduled with capped exponential backoff
+    and marked failed after MAX_ATTEMPTS. Returns (sent, failed) counts.
+
+    Raises MailServerUnavailable, without charging the batch an attempt, if
+    the connection can't be opened at all.
+    """
+    emails = claim_due(batch_size)
+    if not emails:
+        return 0, 0
+
+    mail_connection = get_connection()
+    try:
+        mail_connection.open()
+    except Exception as e:
+        release(emails, e)
+        raise MailServerUnavailable(e) from e
+
+    sent = failed = 0
+    for email in emails:
+        try:
+            build_message(email, mail_connection).send()
+        except Exception as e:
+            failed += 1
+            record_failure(email, e)
+        else:
+            sent += 1
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+    try:
+        mail_connection.close()
+    except Exception:
+        logger.warning('Could not close the mail connection', exc_info=True)
+
+    OutboxEmail.objects.bulk_update(emails, ['status', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
+
+
+def requeue_failed():
+    """Gives emails that ran out of attempts a fresh set; returns how many."""
+    return OutboxEmail.objects.filter(status='failed').update(
+        status='pending', attempts=0, next_attempt_at=timezone.now(),
+    )
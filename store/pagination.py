@@ -0,0 +1,115 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Below this many rows an exact COUNT(*) is cheap enough to keep
+ESTIMATE_THRESHOLD = 10000
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next()
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed ordering. Each page seeks past the last
+    row of the previous one instead of counting and skipping rows, so with a
+    matching index every page costs the same as the first.
+
+    ``ordering`` must end in a unique column (normally ``id``) so that the
+    cursor identifies exactly one position.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [queryset.model._meta.get_field(key.lstrip('-')) for key in ordering]
+
+    def encode_cursor(self, obj):
+        values = [field.value_to_string(obj) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                return None
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (binascii.Error, UnicodeError, ValueError, TypeError, ValidationError):
+            return None
+
+    def seek(self, values):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), honouring each key's direction
+        condition = Q()
+        for position, key in enumerate(self.ordering):
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            step = Q(**{f'{self.fields[position].name}__{lookup}': values[position]})
+            for previous in range(position):
+                step &= Q(**{self.fields[previous].name: values[previous]})
+            condition |= step
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None:
+            queryset = queryset.filter(self.seek(values))
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = self.encode_cursor(rows[self.per_page - 1]) if len(rows) > self.per_page else None
+        return KeysetPage(rows[:self.per_page], next_cursor)
+
+
+def estimate_row_count(model):
+    """
+    Planner statistics for the model's table, or None where the database
+    keeps none we can read cheaply.
+    """
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 means the table has never been analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large admin changelists: an unfiltered queryset on a big
+    table reports the planner's row estimate instead of running COUNT(*).
+    Filtered querysets and small tables are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.has_filters():
+            estimate = estimate_row_count(self.object_list.model)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,68 @@
+import numpy as np
+from scipy import sparse
+
+from django.db import transaction
+
+from .cache import bump_catalog_version
+from .models import OrderItem, ProductRecommendation
+
+
+def co_purchase_matrix(pairs):
+    """
+    ``pairs`` yields (order_id, product_id). Returns (product_ids, C) where
+    C[i, j] is the number of orders containing both product_ids[i] and
+    product_ids[j], with an empty diagonal.
+    """
+    orders, products = [], []
+    for order_id, product_id in pairs:
+        orders.append(order_id)
+        products.append(product_id)
+    if not orders:
+        return np.array([], dtype=np.int64), sparse.csr_matrix((0, 0))
+
+    order_index, order_rows = np.unique(np.array(orders), return_inverse=True)
+    product_ids, product_cols = np.unique(np.array(products), return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(order_rows), dtype=np.float32), (order_rows, product_cols)),
+        shape=(len(order_index), len(product_ids)),
+    )
+    # A product listed twice in one order still counts once
+    baskets.data[:] = 1
+
+    matrix = (baskets.T @ baskets).tocsr()
+    matrix.setdiag(0)
+    matrix.eliminate_zeros()
+    return product_ids, matrix
+
+
+def top_k(product_ids, matrix, k):
+    """Yields (product_id, [(neighbour_id, score), ...]) best first."""
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        scores = matrix.data[start:end]
+        columns = matrix.indices[start:end]
+        if len(scores) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            scores, columns = scores[keep], columns[keep]
+        # Highest score first, lower product id breaks ties
+        order = np.lexsort((product_ids[columns], -scores))
+        yield int(product_ids[row]), [(int(product_ids[columns[i]]), float(scores[i])) for i in order]
+
+
+def build_recommendations(k=4):
+    pairs = OrderItem.objects.filter(product__isnull=False).values_list('order_id', 'product_id')
+    product_ids, matrix = co_purchase_matrix(pairs.iterator(chunk_size=5000))
+
+    rows = [
+        ProductRecommendation(product_id=product_id, recommended_id=neighbour, score=score, rank=rank)
+        for product_id, neighbours in top_k(product_ids, matrix, k)
+        for rank, (neighbour, score) in enumerate(neighbours, 1)
+    ]
+    with transaction.atomic():
+        ProductRecommendation.objects.all().delete()
+        ProductRecommendation.objects.bulk_create(rows, batch_size=5000)
+    # Product pages embed their neighbours
+    bump_catalog_version()
+    return len(rows)
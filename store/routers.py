@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Catalogue tables: read on every page, written only from the admin, imports
+# and the nightly jobs, so a few seconds of replication lag is harmless.
+# Orders, sessions, users and the outbox always stay on the primary.
+REPLICA_MODELS = {
+    'store.category',
+    'store.brand',
+    'store.product',
+    'store.productattribute',
+    'store.productrecommendation',
+    'store.sitesetting',
+    'store.dailysales',
+    'store.dailyproductsales',
+    'store.dailystatussales',
+}
+
+_pinned = ContextVar('store_primary_pinned', default=False)
+
+
+def replica_alias():
+    return getattr(settings, 'READ_REPLICA_DATABASE', None)
+
+
+@contextmanager
+def use_primary():
+    """Sends every read made inside the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Reads of the catalogue models go to READ_REPLICA_DATABASE when one is
+    configured. Everything else, and every read made inside a transaction
+    or inside use_primary() (which store.middleware.ReplicaPinningMiddleware
+    wraps writing requests in), goes to the primary, so a request always sees
+    its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = replica_alias()
+        if (
+            not replica
+            or _pinned.get()
+            or model._meta.label_lower not in REPLICA_MODELS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas follow the primary's schema through replication
+        if db == replica_alias():
+            return False
+        return None
@@ -0,0 +1,329 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Order
+
+# Relative importance of each Product column when ranking matches
+WEIGHTS = {
+    'name': 'A',
+    'description': 'B',
+    'specifications': 'C',
+}
+
+FTS_TABLE = 'store_product_fts'
+ORDER_FTS_TABLE = 'store_order_fts'
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+class SearchBackend:
+    """
+    Ranked product search. ``search`` narrows a Product queryset to the rows
+    matching ``query`` and annotates them with ``search_rank`` (higher is
+    better); ``update``/``delete`` keep the index in step with Product saves.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def update(self, product_ids):
+        pass
+
+    def delete(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class BasicSearchBackend(SearchBackend):
+    """
+    Fallback for databases without a full-text engine. Unindexed, but still
+    ranks name matches above description matches.
+    """
+
+    def search(self, queryset, query):
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query)).annotate(
+            search_rank=Case(
+                When(name__icontains=query, then=Value(2.0)),
+                default=Value(1.0),
+                output_field=FloatField(),
+            ),
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Weighted tsvector stored on store_product.search_vector and covered by a
+    GIN index (see migration 0002_product_search_index).
+    """
+
+    vector_sql = ' || '.join(
+        f"setweight(to_tsvector('english', coalesce({column}::text, '')), '{weight}')"
+        for column, weight in WEIGHTS.items()
+    )
+
+    def tsquery_text(self, query):
+        # Every term, prefix-matched like the SQLite backend: "sams gal" -> "sams:* & gal:*"
+        return ' & '.join(f'{term}:*' for term in _terms(query))
+
+    def search(self, queryset, query):
+        text = self.tsquery_text(query)
+        if not text:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        tsquery = "to_tsquery('english', %s)"
+        return queryset.alias(
+            search_match=RawSQL(f'store_product.search_vector @@ {tsquery}', [text], output_field=BooleanField()),
+        ).filter(search_match=True).annotate(
+            search_rank=RawSQL(f'ts_rank(store_product.search_vector, {tsquery})', [text], output_field=FloatField()),
+        )
+
+    def update(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE store_product SET search_vector = {self.vector_sql} WHERE id = ANY(%s)',
+                [list(product_ids)],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE store_product SET search_vector = {self.vector_sql}')
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 table keyed by product id (rowid), ranked with bm25.
+    """
+
+    columns = ', '.join(WEIGHTS)
+    # bm25 weights follow the order of WEIGHTS: A=10, B=4, C=2
+    bm25 = f'bm25({FTS_TABLE}, 10.0, 4.0, 2.0)'
+
+    def match_expression(self, query):
+        # Quote every term so user input can never be parsed as FTS syntax,
+        # and prefix-match so "sams" finds "Samsung".
+        return ' '.join(f'"{term}"*' for term in _terms(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]),
+        ).annotate(
+            # Materialised once per statement; a plain correlated subquery
+            # re-runs the MATCH for every product row and takes seconds on
+            # broad queries over a large catalogue
+            search_rank=RawSQL(
+                f'(WITH ranks AS MATERIALIZED (SELECT rowid AS id, -{self.bm25} AS rank '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) '
+                f'SELECT rank FROM ranks WHERE ranks.id = store_product.id)',
+                [match],
+                output_field=FloatField(),
+            ),
+        )
+
+    def update(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {self.columns}) '
+                f"SELECT id, name, coalesce(description, ''), coalesce(specifications, '') "
+                f'FROM store_product WHERE id IN ({placeholders})',
+                product_ids,
+            )
+
+    def delete(self, product_ids):
+        product_ids = list(product_ids)
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {self.columns}) '
+                f"SELECT id, name, coalesce(description, ''), coalesce(specifications, '') FROM store_product"
+            )
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, BasicSearchBackend)()
+
+
+def search_products(queryset, query):
+    return get_search_backend().search(queryset, query)
+
+
+# Order lookup. Staff search by any part of the order number, customer name,
+# email or phone number, so orders are matched on substrings through trigram
+# indexes rather than on words.
+
+ORDER_TEXT_COLUMNS = ('order_number', 'customer_name', 'customer_email')
+# Order fields whose saves need the index updated; phone_digits follows customer_phone
+ORDER_SEARCH_FIELDS = {*ORDER_TEXT_COLUMNS, 'customer_phone', 'phone_digits'}
+# Trigrams can't narrow down anything shorter
+MIN_ORDER_TERM_LENGTH = 3
+
+_PHONE_QUERY = re.compile(r'^\+?[\d\s().-]+$')
+
+
+def order_query(query):
+    """
+    Splits an order search into (phone, terms). A query that reads as a
+    phone number is one term, matched on the normalised phone (or the order
+    number): ('712345', '0712345') for '0712 345'. Anything else is words,
+    each of which has to match: (None, ['jane', 'otieno']).
+    """
+    query = query.strip()
+    if _PHONE_QUERY.match(query):
+        digits = re.sub(r'\D', '', query)
+        phone = Order.normalize_phone(query)
+        if len(phone) >= MIN_ORDER_TERM_LENGTH:
+            return phone, [digits]
+        return None, []
+    return None, [term for term in query.lower().split() if len(term) >= MIN_ORDER_TERM_LENGTH]
+
+
+class OrderSearchBackend:
+    """
+    Order lookup. ``search`` narrows an Order queryset to the orders matching
+    ``query`` (see order_query); ``update``/``delete`` keep the index in step
+    with Order saves.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def update(self, order_ids):
+        pass
+
+    def delete(self, order_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class BasicOrderSearchBackend(OrderSearchBackend):
+    """Fallback for other databases; unindexed."""
+
+    def search(self, queryset, query):
+        phone, terms = order_query(query)
+        if not terms:
+            return queryset.none()
+        if phone:
+            return queryset.filter(Q(phone_digits__contains=phone) | Q(order_number__icontains=terms[0]))
+        for term in terms:
+            queryset = queryset.filter(
+                Q(order_number__icontains=term) | Q(customer_name__icontains=term) | Q(customer_email__icontains=term)
+            )
+        return queryset
+
+
+def _like(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+class PostgresOrderSearchBackend(OrderSearchBackend):
+    """
+    ILIKE over pg_trgm GIN indexes on each searched column (see migration
+    0010_order_search_index), so substring matches don't scan the table.
+    """
+
+    def search(self, queryset, query):
+        phone, terms = order_query(query)
+        if not terms:
+            return queryset.none()
+        if phone:
+            sql = 'store_order.phone_digits LIKE %s OR store_order.order_number ILIKE %s'
+            params = [_like(phone), _like(terms[0])]
+        else:
+            match_any = '(' + ' OR '.join(f'store_order.{column} ILIKE %s' for column in ORDER_TEXT_COLUMNS) + ')'
+            sql = ' AND '.join([match_any] * len(terms))
+            params = [_like(term) for term in terms for column in ORDER_TEXT_COLUMNS]
+        return queryset.alias(
+            search_match=RawSQL(f'({sql})', params, output_field=BooleanField()),
+        ).filter(search_match=True)
+
+
+class SQLiteOrderSearchBackend(OrderSearchBackend):
+    """
+    FTS5 table with the trigram tokenizer, keyed by order id (rowid), which
+    answers substring matches from its index.
+    """
+
+    columns = ', '.join((*ORDER_TEXT_COLUMNS, 'phone_digits'))
+
+    def _phrase(self, term):
+        return '"' + term.replace('"', '""') + '"'
+
+    def match_expression(self, phone, terms):
+        if phone:
+            return f'(phone_digits : {self._phrase(phone)} OR order_number : {self._phrase(terms[0])})'
+        text_columns = '{' + ' '.join(ORDER_TEXT_COLUMNS) + '}'
+        return ' AND '.join(f'{text_columns} : {self._phrase(term)}' for term in terms)
+
+    def search(self, queryset, query):
+        phone, terms = order_query(query)
+        if not terms:
+            return queryset.none()
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {ORDER_FTS_TABLE} WHERE {ORDER_FTS_TABLE} MATCH %s',
+                [self.match_expression(phone, terms)],
+            ),
+        )
+
+    def _insert(self, where='', params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ORDER_FTS_TABLE} (rowid, {self.columns}) '
+                f'SELECT id, {self.columns} FROM store_order {where}',
+                params,
+            )
+
+    def update(self, order_ids):
+        order_ids = list(order_ids)
+        placeholders = ', '.join(['%s'] * len(order_ids))
+        self.delete(order_ids)
+        self._insert(f'WHERE id IN ({placeholders})', order_ids)
+
+    def delete(self, order_ids):
+        order_ids = list(order_ids)
+        placeholders = ', '.join(['%s'] * len(order_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {ORDER_FTS_TABLE} WHERE rowid IN ({placeholders})', order_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {ORDER_FTS_TABLE}')
+        self._insert()
+
+
+ORDER_BACKENDS = {
+    'postgresql': PostgresOrderSearchBackend,
+    'sqlite': SQLiteOrderSearchBackend,
+}
+
+
+def get_order_search_backend():
+    return ORDER_BACKENDS.get(connection.vendor, BasicOrderSearchBackend)()
+
+
+def search_orders(queryset, query):
+    return get_order_search_backend().search(queryset, query)
@@ -0,0 +1,277 @@
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import cache
+from .catalog import chunked
+from .models import Brand, Category, Order, OrderItem, Product
+from .search import get_order_search_backend, get_search_backend
+from .specs import index_attributes
+
+# category -> (brands and their product lines, price range in KES, spec choices)
+CATALOG = {
+    'Smartphones': (
+        {
+            'Samsung': ['Galaxy A', 'Galaxy S', 'Galaxy Z Flip'],
+            'Apple': ['iPhone'],
+            'Tecno': ['Spark', 'Camon', 'Pova'],
+            'Infinix': ['Hot', 'Note', 'Zero'],
+            'Xiaomi': ['Redmi', 'Redmi Note', 'Poco'],
+        },
+        (8000, 220000),
+        {
+            'RAM': ['3GB', '4GB', '6GB', '8GB', '12GB'],
+            'Storage': ['64GB', '128GB', '256GB', '512GB'],
+            'Screen Size': ['6.1"', '6.5"', '6.7"', '6.8"'],
+            'Battery': ['4000mAh', '5000mAh', '6000mAh'],
+        },
+    ),
+    'Laptops': (
+        {
+            'HP': ['EliteBook', 'ProBook', 'Pavilion', 'Victus'],
+            'Dell': ['Latitude', 'Inspiron', 'XPS', 'Vostro'],
+            'Lenovo': ['ThinkPad', 'IdeaPad', 'Legion', 'Yoga'],
+            'Apple': ['MacBook Air', 'MacBook Pro'],
+            'Asus': ['VivoBook', 'ZenBook', 'ROG Strix'],
+        },
+        (28000, 380000),
+        {
+            'RAM': ['8GB', '16GB', '32GB'],
+            'Storage': ['256GB SSD', '512GB SSD', '1TB SSD'],
+            'Processor': ['Core i5', 'Core i7', 'Ryzen 5', 'Ryzen 7', 'Apple M2'],
+            'Screen Size': ['13.3"', '14"', '15.6"'],
+        },
+    ),
+    'Tablets': (
+        {
+            'Samsung': ['Galaxy Tab A', 'Galaxy Tab S'],
+            'Apple': ['iPad', 'iPad Air', 'iPad Pro'],
+            'Lenovo': ['Tab M', 'Tab P'],
+        },
+        (15000, 180000),
+        {
+            'Storage': ['32GB', '64GB', '128GB', '256GB'],
+            'Screen Size': ['8"', '10.1"', '11"', '12.9"'],
+            'Connectivity': ['Wi-Fi', 'Wi-Fi + LTE'],
+        },
+    ),
+    'Televisions': (
+        {
+            'Samsung': ['Crystal UHD', 'QLED', 'Neo QLED'],
+            'LG': ['UHD', 'NanoCell', 'OLED'],
+            'Hisense': ['A6', 'U7', 'ULED'],
+            'TCL': ['P635', 'C645', 'QLED'],
+        },
+        (18000, 450000),
+        {
+            'Screen Size': ['32"', '43"', '50"', '55"', '65"', '75"'],
+            'Resolution': ['HD', 'Full HD', '4K UHD'],
+            'Smart TV': ['Yes', 'No'],
+        },
+    ),
+    'Audio': (
+        {
+            'JBL': ['Flip', 'Charge', 'Tune', 'PartyBox'],
+            'Sony': ['WH-1000X', 'WF-C', 'SRS-XB'],
+            'Oraimo': ['FreePods', 'BoomPop', 'SpaceBuds'],
+        },
+        (1500, 65000),
+        {
+            'Type': ['Earbuds', 'Headphones', 'Speaker'],
+            'Connectivity': ['Bluetooth', 'Wired'],
+            'Battery Life': ['8 hours', '20 hours', '30 hours'],
+        },
+    ),
+    'Accessories': (
+        {
+            'Oraimo': ['PowerBank', 'Charger', 'Cable'],
+            'Anker': ['PowerCore', 'PowerPort', 'PowerLine'],
+            'Samsung': ['Charger', 'Case', 'Screen Protector'],
+            'Logitech': ['Mouse', 'Keyboard', 'Webcam'],
+        },
+        (500, 15000),
+        {
+            'Colour': ['Black', 'White', 'Blue', 'Grey'],
+            'Compatibility': ['Android', 'iPhone', 'Universal'],
+        },
+    ),
+}
+
+FIRST_NAMES = ['Wanjiru', 'Otieno', 'Achieng', 'Kamau', 'Njeri', 'Mwangi', 'Akinyi', 'Kiprop', 'Chebet', 'Mutua',
+               'Wambui', 'Omondi', 'Nyambura', 'Kipchoge', 'Atieno', 'Karanja', 'Moraa', 'Kibet', 'Zawadi', 'Baraka']
+LAST_NAMES = ['Kariuki', 'Odhiambo', 'Wafula', 'Njoroge', 'Kiptoo', 'Mutiso', 'Owino', 'Chege', 'Korir', 'Maina']
+TOWNS = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika', 'Machakos', 'Nyeri', 'Meru', 'Kitale']
+
+# Status mix for orders old enough to have been fulfilled; the last week
+# is still moving through the pipeline
+SETTLED_STATUSES = {'delivered': 80, 'cancelled': 12, 'shipped': 8}
+RECENT_STATUSES = {'pending': 30, 'confirmed': 20, 'processing': 20, 'shipped': 20, 'cancelled': 10}
+PAYMENT_METHODS = {'mpesa': 60, 'cod': 35, 'card': 5}
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """Lets bulk_create keep the created_at/updated_at values set on the objects."""
+    fields = [f for f in model._meta.fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _weighted(rng, choices):
+    return rng.choices(list(choices), weights=list(choices.values()))[0]
+
+
+def _past(rng, now, days):
+    # Skewed towards recent dates, as a growing shop's history is
+    return now - timedelta(days=days * rng.random() ** 2, seconds=rng.randrange(86400))
+
+
+class Seeder:
+    """
+    Generates a plausible catalogue and order history with bulk inserts.
+    ``rng`` makes runs reproducible; the run id keeps slugs and order
+    numbers unique when seeding into a database that already has data.
+    """
+
+    def __init__(self, seed=None, days=365, batch_size=5000, progress=None):
+        self.rng = random.Random(seed)
+        self.run = uuid.UUID(int=self.rng.getrandbits(128)).hex[:6]
+        self.days = days
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        self.now = timezone.now()
+
+    def taxonomy(self):
+        categories, brands = {}, {}
+        for name in CATALOG:
+            categories[name], _ = Category.objects.get_or_create(slug=slugify(name), defaults={'name': name})
+        for lines, price_range, specs in CATALOG.values():
+            for name in lines:
+                if name not in brands:
+                    brands[name], _ = Brand.objects.get_or_create(slug=slugify(name), defaults={'name': name})
+        return categories, brands
+
+    def product(self, number, categories, brands):
+        rng = self.rng
+        category = rng.choice(list(CATALOG))
+        lines, (low, high), spec_choices = CATALOG[category]
+        brand = rng.choice(list(lines))
+        name = f'{brand} {rng.choice(lines[brand])} {rng.randint(2, 99)}{rng.choice(["", "", " Pro", " Lite", " Plus"])}'
+        specs = {spec: rng.choice(values) for spec, values in spec_choices.items() if rng.random() < 0.9}
+        price = Decimal(round(low * (high / low) ** rng.random(), -2) - 1)
+        created = _past(rng, self.now, self.days)
+        status = _weighted(rng, {'in_stock': 85, 'pre_order': 10, 'out_of_stock': 5})
+        quantity = rng.randint(1, 60) if status == 'in_stock' else 0
+        return Product(
+            name=name,
+            slug=f'{slugify(name)}-{self.run}-{number}',
+            description=f'{name} from {brand}, with full local warranty and delivery countrywide.',
+            specifications=specs,
+            price=price,
+            category=categories[category],
+            brand=brands[brand],
+            stock_quantity=quantity,
+            allow_preorder=status == 'pre_order',
+            stock_status=status,
+            is_featured=rng.random() < 0.02,
+            created_at=created,
+            updated_at=created,
+        )
+
+    def seed_products(self, count):
+        categories, brands = self.taxonomy()
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            batch = [self.product(created + i, categories, brands) for i in range(size)]
+            with transaction.atomic(), explicit_timestamps(Product):
+                Product.objects.bulk_create(batch)
+            created += size
+            self.progress(f'{created} products')
+
+        # bulk_create skips post_save, so derived indexes and caches are refreshed here
+        seeded = Product.objects.filter(slug__contains=f'-{self.run}-').only('id', 'specifications').order_by('id')
+        for batch in chunked(seeded.iterator(chunk_size=self.batch_size), self.batch_size):
+            index_attributes(batch)
+        get_search_backend().rebuild()
+        cache.invalidate_nav_categories()
+        cache.invalidate_nav_brands()
+        cache.bump_catalog_version()
+        return created
+
+    def seed_orders(self, count, max_items=4):
+        rng = self.rng
+        products = list(Product.objects.values_list('id', 'name', 'price', 'category_id'))
+        if not products:
+            return 0
+        # A few products sell far more than the rest
+        rng.shuffle(products)
+        popularity = list(accumulate(1 / (rank + 1) for rank in range(len(products))))
+        by_category = {}
+        for product in products:
+            by_category.setdefault(product[3], []).append(product)
+
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            orders, baskets = [], []
+            for i in range(size):
+                first = rng.choices(products, cum_weights=popularity)[0]
+                basket = {first[0]: first}
+                for _ in range(rng.choices(range(max_items), weights=[0.5 ** n for n in range(max_items)])[0]):
+                    # Add-ons mostly come from the same category (cases, chargers...)
+                    pool = by_category[first[3]] if rng.random() < 0.6 else products
+                    extra = rng.choice(pool)
+                    basket[extra[0]] = extra
+                quantities = {pid: rng.choice([1, 1, 1, 2]) for pid in basket}
+                placed = _past(rng, self.now, self.days)
+                recent = self.now - placed < timedelta(days=7)
+                first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                orders.append(Order(
+                    order_number=f'SEED-{self.run.upper()}-{created + i:07d}',
+                    customer_name=f'{first_name} {last_name}',
+                    customer_email=f'{first_name}.{last_name}{rng.randint(1, 999)}@example.com'.lower(),
+                    customer_phone=f'07{rng.randint(0, 99999999):08d}',
+                    customer_address=f'{rng.randint(1, 400)} {rng.choice(LAST_NAMES)} Road, {rng.choice(TOWNS)}',
+                    payment_method=_weighted(rng, PAYMENT_METHODS),
+                    total_amount=sum(basket[pid][2] * qty for pid, qty in quantities.items()),
+                    status=_weighted(rng, RECENT_STATUSES if recent else SETTLED_STATUSES),
+                    created_at=placed,
+                    updated_at=placed + timedelta(days=0 if recent else rng.randint(1, 5)),
+                ))
+                baskets.append((basket, quantities))
+
+            # bulk_create skips save() and post_save, which keep order search up to date
+            for order in orders:
+                order.phone_digits = Order.normalize_phone(order.customer_phone)
+            with transaction.atomic(), explicit_timestamps(Order):
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product_id=pid,
+                        product_name=basket[pid][1],
+                        product_price=basket[pid][2],
+                        quantity=qty,
+                        subtotal=basket[pid][2] * qty,
+                    )
+                    for order, (basket, quantities) in zip(orders, baskets)
+                    for pid, qty in quantities.items()
+                ])
+                get_order_search_backend().update([order.id for order in orders])
+            created += size
+            self.progress(f'{created} orders')
+        return created
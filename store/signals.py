@@ -0,0 +1,89 @@
+import logging
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache
+from .images import generate_renditions
+from .search import ORDER_SEARCH_FIELDS, get_order_search_backend, get_search_backend
+from .specs import index_attributes
+from .models import Brand, Category, Order, Product, SiteSetting
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=SiteSetting)
+def site_setting_changed(sender, **kwargs):
+    cache.invalidate_site_settings()
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    cache.invalidate_nav_categories()
+    cache.bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Brand)
+def brand_changed(sender, **kwargs):
+    cache.invalidate_nav_brands()
+    cache.bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, **kwargs):
+    # Category cards show a product count
+    cache.invalidate_nav_categories()
+    cache.bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_search_backend().update([instance.pk])
+    index_attributes([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().delete([instance.pk])
+
+
+@receiver(post_save, sender=Order)
+def index_order(sender, instance, update_fields=None, **kwargs):
+    # Status changes (save(update_fields=['status'])) don't touch the index
+    if update_fields is not None and not ORDER_SEARCH_FIELDS & set(update_fields):
+        return
+    get_order_search_backend().update([instance.pk])
+
+
+@receiver(post_delete, sender=Order)
+def unindex_order(sender, instance, **kwargs):
+    get_order_search_backend().delete([instance.pk])
+
+
+def image_field(sender):
+    return 'image' if sender is Product else 'logo'
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Brand)
+def note_image_upload(sender, instance, **kwargs):
+    # The field commits a new upload while saving, so this is the last point
+    # an uploaded file can be told apart from the one already stored
+    image = getattr(instance, image_field(sender))
+    instance._image_uploaded = bool(image) and not image._committed
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Brand)
+def render_image_renditions(sender, instance, raw=False, **kwargs):
+    # Only new uploads; other saves keep the renditions they have, and
+    # generate_renditions backfills images set by name
+    image = getattr(instance, image_field(sender))
+    if raw or not image or not getattr(instance, '_image_uploaded', False):
+        return
+    instance._image_uploaded = False
+    try:
+        generate_renditions(image.name, storage=image.storage)
+    except Exception:
+        # Pages fall back to the original until generate_renditions is run
+        logger.exception('Could not render renditions for %s', image.name)
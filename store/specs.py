@@ -0,0 +1,127 @@
+import json
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.text import slugify
+
+from .cache import get_catalog_version
+from .models import ProductAttribute
+
+SPEC_CACHE_TIMEOUT = 60 * 10
+
+# Shop parameters that can never be attribute filters
+RESERVED_PARAMS = {'q', 'category', 'brand', 'stock', 'min_price', 'max_price', 'sort', 'page', 'cursor'}
+# Added to attribute keys that would clash with one of them
+RESERVED_SUFFIX = '-spec'
+
+# Specs lines without a "Name: value" shape are kept together under this name
+FREE_TEXT_NAME = 'Features'
+
+_SEPARATOR = re.compile(r'\s*(?::|\t)\s*')
+
+
+def attribute_key(name):
+    """'Screen Size' -> 'screen-size', the name used in shop URLs."""
+    key = slugify(name)[:100]
+    # A spec called "Brand" or "Sort" can't take over the shop's own parameter
+    return f'{key}{RESERVED_SUFFIX}' if key in RESERVED_PARAMS else key
+
+
+def _text(value):
+    if isinstance(value, (list, tuple)):
+        return ', '.join(_text(item) for item in value)
+    return '' if value is None else str(value).strip()
+
+
+def parse_specifications(value):
+    """
+    Turns specs as they arrive (a dict, JSON text or "Name: value" lines) into
+    the {name: value} dict stored on Product.specifications.
+    """
+    if isinstance(value, dict):
+        specs = {_text(name): _text(item) for name, item in value.items()}
+        return {name: item for name, item in specs.items() if name and item}
+
+    text = _text(value)
+    if not text:
+        return {}
+    if text.startswith('{'):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return parse_specifications(data)
+
+    specs, free_text = {}, []
+    for line in text.splitlines():
+        line = line.strip().lstrip('-*•').strip()
+        if not line:
+            continue
+        parts = _SEPARATOR.split(line, maxsplit=1)
+        if len(parts) == 2 and parts[0] and parts[1] and len(parts[0]) <= 50:
+            specs[parts[0]] = parts[1]
+        else:
+            free_text.append(line)
+    if free_text:
+        specs[FREE_TEXT_NAME] = '\n'.join(free_text)
+    return specs
+
+
+def attribute_rows(product_id, specifications):
+    rows = {}
+    for name, value in parse_specifications(specifications).items():
+        key, value = attribute_key(name), _text(value)
+        # Long free text is shown on the product page but is no use as a filter
+        if key and value and len(name) <= 100 and len(value) <= 255 and '\n' not in value:
+            rows.setdefault(key, ProductAttribute(product_id=product_id, key=key, name=name, value=value))
+    return rows.values()
+
+
+def index_attributes(products):
+    """
+    Rewrites the ProductAttribute rows of ``products`` (objects with ``id``
+    and ``specifications``) from their specs. Two queries per batch.
+    """
+    products = list(products)
+    with transaction.atomic():
+        ProductAttribute.objects.filter(product_id__in=[p.id for p in products]).delete()
+        ProductAttribute.objects.bulk_create(
+            [row for p in products for row in attribute_rows(p.id, p.specifications)],
+            batch_size=1000,
+        )
+
+
+def get_attribute_keys():
+    key = f'store:attributes:keys:{get_catalog_version()}'
+    keys = cache.get(key)
+    if keys is None:
+        keys = set(ProductAttribute.objects.order_by().values_list('key', flat=True).distinct())
+        cache.set(key, keys, SPEC_CACHE_TIMEOUT)
+    return keys
+
+
+def attribute_filters(params):
+    """
+    {key: [values]} for the query parameters naming a known attribute, so
+    ?ram=16GB&ram=32GB&storage=512GB means (16GB or 32GB RAM) and 512GB.
+    """
+    names = [name for name in params if name not in RESERVED_PARAMS]
+    if not names:
+        return {}
+    known = get_attribute_keys()
+    filters = {}
+    for name in names:
+        values = [value for value in params.getlist(name) if value] if hasattr(params, 'getlist') else [params[name]]
+        if name in known and values:
+            filters[name] = sorted(values)
+    return filters
+
+
+def filter_by_attributes(queryset, filters):
+    # One semi-join per attribute, each resolved on product_attribute_lookup_idx
+    for key, values in filters.items():
+        matching = ProductAttribute.objects.filter(key=key, value__in=values).values('product_id')
+        queryset = queryset.filter(id__in=matching)
+    return queryset
@@ -17,6 +17,7 @@ document.addEventListener('DOMContentLoaded', function () {
     initSmoothScroll();
     initLoadingBar();
     initSearchAutocomplete();
+    initCartBadge();
 });
 
 // ===================================
@@ -220,6 +221,69 @@ function hideLoadingBar() {
     }
 }
 
+// ===================================
+// CART BADGE
+// ===================================
+
+// Pages are cached alike for every anonymous visitor, so the cart count and
+// the CSRF token for the page's forms are fetched separately
+function initCartBadge() {
+    const cartIcon = document.getElementById('cartIcon');
+    if (!cartIcon) return;
+
+    const loadBadge = () => fetch(cartIcon.dataset.badgeUrl, { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) throw new Error(`Cart badge: HTTP ${response.status}`);
+            return response.json();
+        })
+        .then(data => {
+            let badge = cartIcon.querySelector('.cart-count');
+            if (data.count > 0) {
+                if (!badge) {
+                    badge = document.createElement('span');
+                    badge.className = 'cart-count';
+                    cartIcon.appendChild(badge);
+                }
+                badge.textContent = data.count;
+            } else if (badge) {
+                badge.remove();
+            }
+            document.querySelectorAll('input[name="csrfmiddlewaretoken"]').forEach(input => {
+                if (!input.value) input.value = data.csrf_token;
+            });
+        });
+
+    let request = loadBadge();
+    // Only a form submitted without its token needs the failure; it retries then
+    request.catch(() => {});
+
+    // A form submitted before the token has arrived waits for it, and is
+    // never sent without one
+    document.querySelectorAll('form').forEach(form => {
+        form.addEventListener('submit', function (e) {
+            const token = form.querySelector('input[name="csrfmiddlewaretoken"]');
+            if (token && !token.value) {
+                e.preventDefault();
+                request = request.catch(loadBadge);
+                request.then(
+                    () => form.submit(),
+                    () => showFormError(form, 'We could not reach the store. Please check your connection and try again.')
+                );
+            }
+        });
+    });
+}
+
+function showFormError(form, message) {
+    let alert = form.querySelector('.alert-error');
+    if (!alert) {
+        alert = document.createElement('div');
+        alert.className = 'alert alert-error';
+        form.prepend(alert);
+    }
+    alert.textContent = message;
+}
+
 // ===================================
 // ADD TO CART
 // ===================================
@@ -312,6 +376,8 @@ function addSpecField() {
 // SEARCH AUTOCOMPLETE
 // ===================================
 
+const SUGGESTION_PLACEHOLDER = 'data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%2248%22 height=%2248%22%3E%3Crect fill=%22%23f0f0f0%22 width=%2248%22 height=%2248%22/%3E%3C/svg%3E';
+
 function initSearchAutocomplete() {
     const searchInput = document.querySelector('.search-input');
     if (!searchInput) return;
@@ -377,7 +443,7 @@ function initSearchAutocomplete() {
     });
 
     function fetchSuggestions(query) {
-        fetch(`/api/search-suggestions?q=${encodeURIComponent(query)}`)
+        fetch(`${searchBar.dataset.suggestUrl}?q=${encodeURIComponent(query)}`)
             .then(response => response.json())
             .then(data => {
                 displaySuggestions(data);
@@ -396,23 +462,40 @@ function initSearchAutocomplete() {
         suggestionsContainer.innerHTML = '';
         currentFocus = -1;
 
-        suggestions.forEach(product => {
+        suggestions.forEach(suggestion => {
             const item = document.createElement('a');
-            item.href = `/product/${product.slug}`;
+            item.href = suggestion.url;
             item.className = 'suggestion-item';
 
-            const imageUrl = product.image ? `/uploads/${product.image}` : '/assets/images/placeholder.png';
-
-            item.innerHTML = `
-                <img src="${imageUrl}" alt="${product.name}" class="suggestion-image" onerror="this.src='data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 width=%2248%22 height=%2248%22%3E%3Crect fill=%22%23f0f0f0%22 width=%2248%22 height=%2248%22/%3E%3C/svg%3E'">
-                <div class="suggestion-info">
-                    <div class="suggestion-name">${product.name}</div>
-                    <div class="suggestion-meta">
-                        <span class="suggestion-category">${product.category}</span>
-                        <span class="suggestion-price">KES ${product.price.toLocaleString()}</span>
+            // Names come from the catalogue, so they are set as text, never as HTML
+            if (suggestion.kind === 'product') {
+                item.innerHTML = `
+                    <img alt="" class="suggestion-image">
+                    <div class="suggestion-info">
+                        <div class="suggestion-name"></div>
+                        <div class="suggestion-meta">
+                            <span class="suggestion-category"></span>
+                            <span class="suggestion-price"></span>
+                        </div>
                     </div>
-                </div>
-            `;
+                `;
+                const image = item.querySelector('.suggestion-image');
+                image.onerror = () => { image.onerror = null; image.src = SUGGESTION_PLACEHOLDER; };
+                image.src = suggestion.image || SUGGESTION_PLACEHOLDER;
+                image.alt = suggestion.name;
+                item.querySelector('.suggestion-category').textContent = suggestion.category;
+                item.querySelector('.suggestion-price').textContent = `KES ${suggestion.price.toLocaleString()}`;
+            } else {
+                item.innerHTML = `
+                    <div class="suggestion-info">
+                        <div class="suggestion-name"></div>
+                        <div class="suggestion-meta"><span class="suggestion-category"></span></div>
+                    </div>
+                `;
+                item.querySelector('.suggestion-category').textContent =
+                    suggestion.kind === 'brand' ? 'Brand' : 'Category';
+            }
+            item.querySelector('.suggestion-name').textContent = suggestion.name;
 
             suggestionsContainer.appendChild(item);
         });
@@ -0,0 +1,21 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.safestring import mark_safe
+
+from store import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def critical_css():
+    """The inlined first-screen CSS, or '' when the bundles aren't built."""
+    return mark_safe(assets.get_critical_css())
+
+
+@register.simple_tag
+def bundle_urls(name):
+    """{% bundle_urls 'store/assets/css/site.css' as urls %}: the bundle once built, else its sources."""
+    if assets.is_bundled(name):
+        return [static(name)]
+    return [static(source) for source in assets.BUNDLES[name]]
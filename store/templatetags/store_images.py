@@ -0,0 +1,15 @@
+from django import template
+
+from store import images
+
+register = template.Library()
+
+
+@register.filter
+def srcset(image, fmt='jpeg'):
+    """
+    {{ product.image|srcset:'webp' }} -> "…-320w.webp 320w, …-640w.webp 640w, …"
+    """
+    if not image:
+        return ''
+    return images.srcset(image.name, fmt, storage=image.storage)
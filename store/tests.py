@@ -1,3 +1,1446 @@
-from django.test import TestCase
+from django.core.cache import cache
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import OperationalError, connection, connections, router, transaction
+from django.template import engines
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .assets import critical_css, minify_css, minify_js
+from .benchmarks import SHOP_VARIANTS, fill_cart, measure, route_targets
+from .cache import get_catalog_version, get_nav_brands, get_nav_categories, get_site_settings
+from .cart import Cart
+from .models import (
+    Brand, Category, DailyProductSales, DailySales, DailyStatusSales, Order, OrderItem, OutboxEmail,
+    Product, ProductAttribute, SiteSetting,
+)
+from .orders import CheckoutError, place_order
+from .outbox import MAX_ATTEMPTS, RETRY_MAX_DELAY, MailServerUnavailable, retry_delay, send_pending
+from . import feeds, images, typeahead
+from .facets import attribute_option_rows, get_facet_counts
+from .images import rendition_name
+from .middleware import RequestMetrics
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .recommendations import build_recommendations
+from .routers import use_primary
+from .rollups import refresh_sales_rollups
+from .search import ORDER_FTS_TABLE, BasicOrderSearchBackend, PostgresSearchBackend, search_orders, search_products
+from .seeding import Seeder
+from .specs import parse_specifications
+from .urls import build_urlpatterns
+from .warmup import compile_templates, store_templates, warm_up
+
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class NavigationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Phones')
+        self.brand = Brand.objects.create(name='Samsung')
+        SiteSetting.objects.create(setting_key='whatsapp_number', setting_value='254700000000')
+
+    def test_navigation_served_from_cache(self):
+        get_site_settings(), get_nav_categories(), get_nav_brands()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site_settings()['whatsapp_number'], '254700000000')
+            self.assertEqual([c.name for c in get_nav_categories()], ['Phones'])
+            self.assertEqual([b.name for b in get_nav_brands()], ['Samsung'])
+
+    def test_saves_invalidate_navigation(self):
+        get_site_settings(), get_nav_categories(), get_nav_brands()
+        SiteSetting.objects.filter(setting_key='whatsapp_number').get().delete()
+        Category.objects.create(name='Laptops')
+        Brand.objects.create(name='Apple')
+        self.assertNotIn('whatsapp_number', get_site_settings())
+        self.assertEqual(len(get_nav_categories()), 2)
+        self.assertEqual(len(get_nav_brands()), 2)
+
+    def test_product_save_refreshes_category_count(self):
+        self.assertEqual(get_nav_categories()[0].product_count, 0)
+        Product.objects.create(name='Galaxy S24', price=100, category=self.category, brand=self.brand)
+        self.assertEqual(get_nav_categories()[0].product_count, 1)
+
+    def test_static_page_skips_navigation_queries(self):
+        self.client.get(reverse('privacy'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('privacy'))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.phone = Product.objects.create(
+            name='Samsung Galaxy S24', price=100, description='Flagship phone',
+        )
+        self.case = Product.objects.create(
+            name='Phone Case', price=10, description='Fits the Samsung Galaxy S24',
+        )
+        Product.objects.create(name='MacBook Air', price=200, description='Laptop')
+
+    def search(self, query):
+        return list(search_products(Product.objects.all(), query).order_by('-search_rank'))
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('samsung'), [self.phone, self.case])
+
+    def test_prefix_and_punctuation(self):
+        self.assertEqual(self.search('gal'), [self.phone, self.case])
+        self.assertEqual(self.search('"macbook'), [Product.objects.get(name='MacBook Air')])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_postgres_query_prefix_matches_like_sqlite(self):
+        backend = PostgresSearchBackend()
+        self.assertEqual(backend.tsquery_text('Sams "gal!'), 'sams:* & gal:*')
+        self.assertEqual(backend.tsquery_text('!!'), '')
+
+    def test_index_follows_saves_and_deletes(self):
+        self.phone.name = 'Pixel 9'
+        self.phone.save()
+        self.assertEqual(self.search('pixel'), [self.phone])
+        self.phone.delete()
+        self.assertEqual(self.search('pixel'), [])
+
+    def test_shop_orders_by_relevance(self):
+        response = self.client.get(reverse('shop'), {'q': 'samsung'})
+        self.assertEqual(list(response.context['page_obj']), [self.phone, self.case])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        # Repeated prices force the id tiebreaker to do its job
+        for i in range(30):
+            Product.objects.create(name=f'Product {i:02d}', price=10 * (i % 4))
+
+    def test_cursor_pages_cover_listing_once(self):
+        paginator = KeysetPaginator(Product.objects.all(), 7, ('-price', '-id'))
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(Product.objects.order_by('-price', '-id')))
+
+    def test_invalid_cursor_starts_from_beginning(self):
+        paginator = KeysetPaginator(Product.objects.all(), 5, ('name', 'id'))
+        self.assertEqual(list(paginator.page('not-a-cursor')), list(paginator.page()))
+
+    def test_shop_follows_next_cursor_without_counting(self):
+        response = self.client.get(reverse('shop'), {'sort': 'name'})
+        next_cursor = response.context['next_cursor']
+        self.assertIsNotNone(next_cursor)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('shop'), {'sort': 'name', 'cursor': next_cursor})
+        self.assertTrue(response.context['is_cursor_page'])
+        self.assertEqual(
+            [p.name for p in response.context['page_obj']],
+            [f'Product {i:02d}' for i in range(12, 24)],
+        )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class FacetCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(name='Phones')
+        self.laptops = Category.objects.create(name='Laptops')
+        self.apple = Brand.objects.create(name='Apple')
+        self.samsung = Brand.objects.create(name='Samsung')
+        Product.objects.create(name='iPhone', price=90000, category=self.phones, brand=self.apple)
+        Product.objects.create(name='Galaxy', price=40000, category=self.phones, brand=self.samsung)
+        Product.objects.create(name='MacBook', price=150000, category=self.laptops, brand=self.apple,
+                               stock_quantity=0, allow_preorder=True)
+
+    def test_counts_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = get_facet_counts({})
+        self.assertEqual(counts['categories'], {self.phones.id: 2, self.laptops.id: 1})
+        self.assertEqual(counts['brands'], {self.apple.id: 2, self.samsung.id: 1})
+        self.assertEqual(counts['stock'], {'in_stock': 2, 'pre_order': 1})
+        self.assertEqual(counts['price'], {'25k_50k': 1, '50k_100k': 1, 'over_100k': 1})
+
+    def test_selected_facet_keeps_its_alternatives(self):
+        counts = get_facet_counts({'brand': 'apple'})
+        # Categories narrow to Apple; brands still show every brand
+        self.assertEqual(counts['categories'], {self.phones.id: 1, self.laptops.id: 1})
+        self.assertEqual(counts['brands'], {self.apple.id: 2, self.samsung.id: 1})
+        self.assertEqual(counts['price'], {'50k_100k': 1, 'over_100k': 1})
+
+    def test_cached_per_signature_until_catalog_changes(self):
+        get_facet_counts({'category': 'phones'})
+        with self.assertNumQueries(0):
+            get_facet_counts({'category': 'phones'})
+        Product.objects.create(name='Pixel', price=50000, category=self.phones)
+        self.assertEqual(get_facet_counts({'category': 'phones'})['categories'][self.phones.id], 3)
+
+    def test_bucket_bounds_are_half_open_and_match_their_links(self):
+        Product.objects.create(name='Pixel', price=50000, category=self.phones)
+        self.assertEqual(get_facet_counts({})['price']['50k_100k'], 2)
+        response = self.client.get(reverse('shop'))
+        for bucket in response.context['facets']['price']:
+            shown = self.client.get(f"{reverse('shop')}?{bucket['query']}").context['page_obj']
+            self.assertEqual(len(shown.object_list), bucket['count'], bucket['label'])
+
+    def test_shop_sidebar_shows_counts(self):
+        response = self.client.get(reverse('shop'), {'category': 'phones'})
+        self.assertContains(response, 'Samsung (1)')
+        self.assertContains(response, 'Laptops (1)')
+
+
+class PlaceOrderTests(TestCase):
+    customer = {
+        'customer_name': 'Jane',
+        'customer_phone': '0712345678',
+        'customer_address': 'Nairobi',
+        'payment_method': 'cod',
+    }
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f'Product {i}', price=100 + i) for i in range(20)]
+
+    def cart(self, size):
+        return {str(p.id): 2 for p in self.products[:size]}
+
+    def test_order_uses_current_prices(self):
+        cart = self.cart(2)
+        Product.objects.filter(id=self.products[0].id).update(price=500)
+        order = place_order(cart, self.customer)
+        self.assertEqual(order.total_amount, 500 * 2 + 101 * 2)
+        self.assertEqual(sorted(order.items.values_list('subtotal', flat=True)), [202, 1000])
+
+    def test_query_count_does_not_grow_with_cart(self):
+        with CaptureQueriesContext(connection) as small:
+            place_order(self.cart(1), self.customer)
+        with self.assertNumQueries(len(small.captured_queries)):
+            place_order(self.cart(20), self.customer)
+
+    def test_failed_item_insert_leaves_no_order(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                place_order(self.cart(3), self.customer)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_empty_cart_is_rejected(self):
+        with self.assertRaises(CheckoutError):
+            place_order({'999': 1}, self.customer)
+
+    def test_tracked_stock_is_reserved(self):
+        phone, case = self.products[:2]
+        Product.objects.filter(id=phone.id).update(stock_quantity=3)
+        place_order({str(phone.id): 2, str(case.id): 5}, self.customer)
+        phone.refresh_from_db()
+        case.refresh_from_db()
+        self.assertEqual((phone.stock_quantity, phone.stock_status), (1, 'in_stock'))
+        self.assertEqual((case.stock_quantity, case.stock_status), (None, 'in_stock'))
+
+    def test_short_stock_rejects_the_whole_order(self):
+        phone, case = self.products[:2]
+        Product.objects.filter(id=phone.id).update(stock_quantity=5)
+        Product.objects.filter(id=case.id).update(stock_quantity=1)
+        with self.assertRaisesMessage(CheckoutError, f'only 1 of {case.name} left'):
+            place_order({str(phone.id): 2, str(case.id): 2}, self.customer)
+        self.assertEqual(Product.objects.get(id=phone.id).stock_quantity, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_selling_out_updates_status_and_caches(self):
+        phone, preorder = self.products[:2]
+        Product.objects.filter(id=phone.id).update(stock_quantity=2)
+        Product.objects.filter(id=preorder.id).update(stock_quantity=1, allow_preorder=True)
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order({str(phone.id): 2, str(preorder.id): 3}, self.customer)
+        phone = Product.objects.get(id=phone.id)
+        self.assertEqual((phone.stock_quantity, phone.stock_status), (0, 'out_of_stock'))
+        self.assertGreater(phone.updated_at, self.products[0].updated_at)
+        self.assertEqual(Product.objects.get(id=preorder.id).stock_status, 'pre_order')
+        self.assertNotEqual(get_catalog_version(), version)
+        with self.assertRaisesMessage(CheckoutError, 'out of stock'):
+            place_order({str(phone.id): 1}, self.customer)
+
+    def test_status_is_derived_on_save(self):
+        product = self.products[0]
+        for quantity, preorder, status in [(None, False, 'in_stock'), (4, False, 'in_stock'),
+                                           (0, False, 'out_of_stock'), (0, True, 'pre_order')]:
+            product.stock_quantity, product.allow_preorder = quantity, preorder
+            product.save(update_fields=['stock_quantity', 'allow_preorder'])
+            self.assertEqual(Product.objects.get(id=product.id).stock_status, status)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    customer = PlaceOrderTests.customer
+
+    def test_parallel_checkouts_never_oversell(self):
+        product = Product.objects.create(name='Galaxy', price=100, stock_quantity=5)
+        results = []
+
+        def checkout():
+            try:
+                # SQLite takes one writer at a time and turns the rest away
+                # rather than queueing them as Postgres's row locks do, so
+                # retry those until they get their turn
+                for attempt in range(200):
+                    try:
+                        place_order({str(product.id): 1}, self.customer)
+                        results.append('ok')
+                        return
+                    except CheckoutError:
+                        results.append('sold out')
+                        return
+                    except OperationalError:
+                        if connection.vendor != 'sqlite':
+                            raise
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(results.count('ok'), 5)
+        self.assertEqual(results.count('sold out'), 15)
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertEqual((product.stock_quantity, product.stock_status), (0, 'out_of_stock'))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboxTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(name='Galaxy', price=100)
+        self.order = place_order({str(product.id): 1}, {
+            'customer_name': 'Jane',
+            'customer_email': 'jane@example.com',
+            'customer_phone': '0712345678',
+            'customer_address': 'Nairobi',
+            'payment_method': 'cod',
+        })
+
+    def test_checkout_queues_instead_of_sending(self):
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ['jane@example.com'])
+        self.assertIn(self.order.order_number, email.subject)
+
+    def test_send_pending_delivers_batch(self):
+        self.assertEqual(send_pending(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].bcc, ['boomerangdigitalsolutions@gmail.com'])
+        self.assertEqual(OutboxEmail.objects.get().status, 'sent')
+        self.assertEqual(send_pending(), (0, 0))
+
+    def test_failures_back_off_then_give_up(self):
+        email = OutboxEmail.objects.get()
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=OSError('refused')), \
+                self.assertLogs('store.outbox', level='WARNING'):
+            self.assertEqual(send_pending(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ('pending', 1))
+            # Not due again until the backoff expires
+            self.assertEqual(send_pending(), (0, 0))
+
+            for _ in range(MAX_ATTEMPTS - 1):
+                OutboxEmail.objects.update(next_attempt_at=email.created_at)
+                send_pending()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.last_error), ('failed', 'refused'))
+
+    def test_backoff_is_capped_and_lasts_about_a_day(self):
+        self.assertEqual(retry_delay(3).total_seconds(), 4 * 60)
+        self.assertEqual(retry_delay(MAX_ATTEMPTS), RETRY_MAX_DELAY)
+        total = sum((retry_delay(n) for n in range(1, MAX_ATTEMPTS)), timedelta())
+        self.assertGreater(total, timedelta(hours=20))
+
+    def test_unreachable_mail_server_puts_batch_back_uncharged(self):
+        email = OutboxEmail.objects.get()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('down')):
+            with self.assertRaises(MailServerUnavailable):
+                send_pending()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 0, 'down'))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(send_pending(), (0, 0))
+
+    def test_command_stops_when_mail_server_is_down(self):
+        for _ in range(3):
+            OutboxEmail.objects.create(subject='s', body='b', from_email='a@example.com', to=['b@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('down')):
+            with self.assertRaises(CommandError):
+                call_command('send_outbox', '--batch-size', '2', stdout=io.StringIO())
+        # Only the first batch was claimed, and it was put back
+        self.assertEqual(OutboxEmail.objects.filter(last_error='down').count(), 2)
+        self.assertFalse(OutboxEmail.objects.exclude(attempts=0).exists())
+
+    def test_failed_emails_can_be_requeued(self):
+        OutboxEmail.objects.update(status='failed', attempts=MAX_ATTEMPTS)
+        call_command('send_outbox', '--retry-failed', stdout=io.StringIO())
+        self.assertEqual(OutboxEmail.objects.get().status, 'sent')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class CartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phone = Product.objects.create(name='Galaxy', price=100)
+        self.case = Product.objects.create(name='Case', price=15)
+
+    def add(self, product, quantity):
+        return self.client.post(reverse('cart'), {'action': 'add', 'product_id': product.id, 'quantity': quantity})
+
+    def test_mutations_keep_count_and_total(self):
+        self.add(self.phone, 2)
+        self.add(self.case, 1)
+        self.add(self.phone, 1)
+        cart = Cart(self.client.session)
+        self.assertEqual((cart.count, cart.total), (4, 315))
+        self.client.post(reverse('cart'), {'action': 'update', 'product_id': self.case.id, 'quantity': 0})
+        cart = Cart(self.client.session)
+        self.assertEqual((cart.count, cart.total), (3, 300))
+
+    def test_bad_input_is_rejected_without_error(self):
+        for data in ({'action': 'add'}, {'action': 'add', 'product_id': 'abc'},
+                     {'action': 'update', 'product_id': self.phone.id, 'quantity': 'many'}):
+            with self.subTest(data=data):
+                response = self.client.post(reverse('cart'), data, follow=True)
+                self.assertContains(response, 'could not be made')
+        self.assertEqual(Cart(self.client.session).count, 0)
+        cart = Cart(self.client.session)
+        cart.add(None)
+        self.assertEqual(cart.count, 0)
+
+    def test_badge_does_not_query_products(self):
+        self.add(self.phone, 2)
+        self.client.get(reverse('cart_badge'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart_badge'))
+        self.assertEqual(response.json()['count'], 2)
+        self.assertFalse([q for q in queries if 'store_product' in q['sql']])
+
+    def test_cart_page_revalidates_prices(self):
+        self.add(self.phone, 2)
+        Product.objects.filter(pk=self.phone.pk).update(price=120)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['total'], 240)
+        self.assertEqual(Cart(self.client.session).total, 240)
+
+    def test_legacy_session_cart_is_upgraded(self):
+        session = self.client.session
+        session['cart'] = {str(self.phone.id): {'quantity': 3}}
+        session.save()
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['cart_count'], 3)
+
+    def test_checkout_places_order_and_clears_cart(self):
+        self.add(self.phone, 2)
+        response = self.client.post(reverse('checkout'), {
+            'customer_name': 'Jane', 'phone': '0712345678', 'location': 'Nairobi', 'payment_method': 'cod',
+        })
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('order_confirmation', args=[order.order_number]))
+        self.assertEqual(order.total_amount, 200)
+        self.assertEqual(Cart(self.client.session).count, 0)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductDetailCachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Phones')
+        self.product = Product.objects.create(name='Galaxy', price=100, category=self.category,
+                                              specifications={'RAM': '8GB'})
+        self.url = reverse('product_detail', args=[self.product.slug])
+
+    def test_repeat_visit_gets_304(self):
+        response = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_settings_change_gets_fresh_page(self):
+        # Only the ETag validates: a date can't see settings or catalogue changes
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        SiteSetting.objects.create(setting_key='whatsapp_number', setting_value='254700000002')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag,
+                                   HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_change_gets_fresh_page(self):
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        self.product.name = 'Galaxy Ultra'
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Galaxy Ultra')
+
+        # The cart badge is fetched separately, so the page doesn't change with the cart
+        etag = response['ETag']
+        self.client.post(reverse('cart'), {'action': 'add', 'product_id': self.product.id, 'quantity': 1})
+        self.client.get(reverse('cart'))  # consume the flash message
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_category_rename_refreshes_cached_fragment(self):
+        self.client.get(self.url)
+        self.category.name = 'Smartphones'
+        self.category.save()
+        self.assertContains(self.client.get(self.url), 'Smartphones')
+
+    def test_missing_product_is_404(self):
+        self.assertEqual(self.client.get(reverse('product_detail', args=['nope'])).status_code, 404)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PAGE_CACHE_ENABLED=True)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Phones')
+        self.product = Product.objects.create(name='Galaxy', price=100, category=self.category, is_featured=True)
+        self.url = reverse('product_detail', args=[self.product.slug])
+
+    def test_anonymous_repeat_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertFalse(first.cookies)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertIn('public', second['Cache-Control'])
+        self.assertIn('max-age=60', second['Cache-Control'])
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_cached_hit_answers_conditional_requests(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (304, 'HIT'))
+
+    def test_query_strings_are_cached_separately(self):
+        self.client.get(reverse('shop'))
+        response = self.client.get(reverse('shop'), {'q': 'nothing matches'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotContains(response, 'Galaxy')
+
+    def test_catalog_change_invalidates(self):
+        self.client.get(reverse('home'))
+        self.product.name = 'Galaxy Ultra'
+        self.product.save()
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Galaxy Ultra')
+
+    def test_site_setting_change_invalidates(self):
+        self.client.get(reverse('contact'))
+        SiteSetting.objects.create(setting_key='whatsapp_number', setting_value='254700000001')
+        self.assertContains(self.client.get(reverse('contact')), '254700000001')
+
+    def test_cart_does_not_fragment_the_cache(self):
+        self.client.get(reverse('home'))
+        self.client.post(reverse('cart'), {'action': 'add', 'product_id': self.product.id, 'quantity': 2})
+        self.client.get(reverse('cart'))  # consume the flash message
+        self.assertEqual(self.client.get(reverse('home'))['X-Cache'], 'HIT')
+        badge = self.client.get(reverse('cart_badge'))
+        self.assertEqual(badge.json()['count'], 2)
+        self.assertIn('no-store', badge['Cache-Control'])
+
+    def test_pending_message_bypasses_cache(self):
+        self.client.get(reverse('home'))
+        self.client.post(reverse('cart'), {'action': 'add', 'product_id': self.product.id, 'quantity': 1})
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Product added to cart!')
+        self.assertFalse(response.has_header('X-Cache'))
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_signed_in_users_get_private_pages(self):
+        self.client.force_login(User.objects.create_user('jane', password='pw'))
+        response = self.client.get(reverse('home'))
+        self.assertFalse(response.has_header('X-Cache'))
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_badge_token_posts_from_cached_page(self):
+        client = Client(enforce_csrf_checks=True)
+        client.get(self.url)
+        self.assertContains(client.get(self.url), 'name="csrfmiddlewaretoken" value=""')
+        token = client.get(reverse('cart_badge')).json()['csrf_token']
+        response = client.post(reverse('cart'), {
+            'csrfmiddlewaretoken': token, 'action': 'add', 'product_id': self.product.id, 'quantity': 1,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(client.get(reverse('cart_badge')).json()['count'], 1)
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_off_without_a_shared_cache(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Cache'))
+        self.assertEqual(response.status_code, 200)
+
+
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, STORAGES=TEST_STORAGES)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, width):
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGBA', (width, width // 2), (255, 0, 0, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('phone.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_writes_renditions_next_to_original(self):
+        product = Product.objects.create(name='Galaxy', price=100, image=self.upload(1200))
+        for width in (320, 640, 960):
+            for fmt in ('webp', 'jpeg'):
+                name = rendition_name(product.image.name, width, fmt)
+                self.assertTrue(name.startswith('products/'))
+                self.assertTrue(default_storage.exists(name), name)
+
+    def test_srcset_lists_renditions(self):
+        product = Product.objects.create(name='Galaxy', price=100, image=self.upload(800))
+        cache.clear()
+        response = self.client.get(reverse('product_detail', args=[product.slug]))
+        self.assertContains(response, '-320w.webp 320w')
+        self.assertContains(response, '-960w.jpg 960w')
+
+    def test_srcset_empty_before_backfill(self):
+        with mock.patch('store.signals.generate_renditions'):
+            product = Product.objects.create(name='Galaxy', price=100, image=self.upload(800))
+        from .templatetags.store_images import srcset
+        self.assertEqual(srcset(product.image, 'webp'), '')
+
+    def test_srcset_reads_recorded_renditions_not_storage(self):
+        product = Product.objects.create(name='Galaxy', price=100, image=self.upload(800))
+        from .templatetags.store_images import srcset
+        with mock.patch.object(product.image.storage, 'exists') as exists:
+            self.assertIn('-640w.webp 640w', srcset(product.image, 'webp'))
+            self.assertIn('-640w.jpg 640w', srcset(product.image, 'jpeg'))
+        exists.assert_not_called()
+
+    def test_backfill_touches_every_product_sharing_an_image(self):
+        with mock.patch('store.signals.generate_renditions'):
+            first = Product.objects.create(name='Galaxy', price=100, image=self.upload(800))
+        second = Product.objects.create(name='Galaxy Twin', price=100, image=first.image.name)
+        version = get_catalog_version()
+        before = {product.pk: product.updated_at for product in Product.objects.all()}
+        call_command('generate_renditions', '--workers', '1', stdout=io.StringIO())
+        for product in Product.objects.all():
+            self.assertGreater(product.updated_at, before[product.pk])
+        self.assertNotEqual(get_catalog_version(), version)
+        # Recorded here, not just in the worker processes' caches
+        with mock.patch.object(second.image.storage, 'exists') as exists:
+            self.assertIn('-320w.webp 320w', images.srcset(second.image.name, 'webp', storage=second.image.storage))
+        exists.assert_not_called()
+
+    def test_only_new_uploads_are_rendered(self):
+        product = Product.objects.create(name='Galaxy', price=100, image=self.upload(800))
+        with mock.patch('store.signals.generate_renditions') as generate:
+            product.price = 90
+            product.save()
+            Product.objects.get().save()
+            generate.assert_not_called()
+            product.image = self.upload(600)
+            product.save()
+            generate.assert_called_once_with(product.image.name, storage=product.image.storage)
+
+
+class CatalogImportExportTests(TestCase):
+    def import_file(self, content, suffix, *args):
+        path = os.path.join(tempfile.mkdtemp(), f'catalog{suffix}')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('catalog_import', path, '--chunk-size', '2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_creates_fks_and_upserts_on_slug(self):
+        Product.objects.create(name='Old Galaxy', slug='galaxy', price=1)
+        out, err = self.import_file(
+            'slug,name,price,category,brand,stock_status,is_featured\n'
+            'galaxy,Galaxy S24,120000,phones,samsung,in_stock,true\n'
+            ',iPhone 15,150000,phones,apple,pre_order,0\n'
+            'bad,Broken,not-a-price,,,,\n',
+            '.csv',
+        )
+        self.assertIn('1 created, 1 updated, 1 skipped', out)
+        self.assertIn('Row 3: invalid price', err)
+        galaxy = Product.objects.get(slug='galaxy')
+        self.assertEqual((galaxy.name, galaxy.price, galaxy.is_featured), ('Galaxy S24', 120000, True))
+        self.assertEqual(galaxy.category.slug, 'phones')
+        self.assertEqual(Product.objects.get(slug='iphone-15').brand.slug, 'apple')
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(list(search_products(Product.objects.all(), 'iphone')), [Product.objects.get(slug='iphone-15')])
+
+    def test_jsonl_round_trip(self):
+        phones = Category.objects.create(name='Phones')
+        Product.objects.create(name='Galaxy', price=100, category=phones, specifications={'RAM': '8GB'})
+        path = os.path.join(tempfile.mkdtemp(), 'products.jsonl')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('catalog_export', '-o', path)
+        with open(path) as f:
+            exported = f.read()
+        self.assertIn('"category": "phones"', exported)
+
+        Product.objects.all().delete()
+        self.import_file(exported, '.jsonl')
+        product = Product.objects.get(slug='galaxy')
+        self.assertEqual((product.category, product.specifications), (phones, {'RAM': '8GB'}))
+
+
+    def test_jsonl_bad_lines_are_reported_by_line_and_skipped(self):
+        out, err = self.import_file(
+            '{"slug": "galaxy", "name": "Galaxy", "price": "100"}\n'
+            '\n'
+            '{"slug": "broken", "name": \n'
+            '["not", "an", "object"]\n'
+            '{"slug": "pixel", "name": "Pixel", "price": "90"}\n',
+            '.jsonl',
+        )
+        self.assertIn('2 created, 0 updated, 2 skipped', out)
+        self.assertIn('Row 3: invalid JSON', err)
+        self.assertIn('Row 4: expected a JSON object', err)
+        self.assertEqual(set(Product.objects.values_list('slug', flat=True)), {'galaxy', 'pixel'})
+
+@override_settings(STORAGES=TEST_STORAGES)
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(name='Phones')
+        self.phone, self.case, self.charger, self.other = [
+            Product.objects.create(name=name, price=10, category=self.phones)
+            for name in ('Galaxy', 'Case', 'Charger', 'Pixel')
+        ]
+        customer = {'customer_name': 'J', 'customer_phone': '1', 'customer_address': 'N', 'payment_method': 'cod'}
+        for basket in ([self.phone, self.case, self.charger], [self.phone, self.case], [self.case, self.other]):
+            place_order({str(p.id): 1 for p in basket}, customer)
+
+    def test_neighbours_ranked_by_co_purchases(self):
+        self.assertEqual(build_recommendations(k=2), 7)
+        neighbours = self.phone.recommendations.values_list('recommended__name', 'score')
+        self.assertEqual(list(neighbours), [('Case', 2.0), ('Charger', 1.0)])
+        self.assertEqual(
+            list(self.case.recommendations.values_list('recommended__name', flat=True)),
+            ['Galaxy', 'Charger'],
+        )
+
+    def test_detail_page_prefers_recommendations(self):
+        url = reverse('product_detail', args=[self.charger.slug])
+        self.assertIn(self.other, self.client.get(url).context['related_products'])
+        build_recommendations()
+        related = self.client.get(url).context['related_products']
+        self.assertEqual(related, [self.phone, self.case])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SalesRollupTests(TestCase):
+    customer = PlaceOrderTests.customer
+
+    def setUp(self):
+        self.phones = Category.objects.create(name='Phones')
+        self.phone = Product.objects.create(name='Galaxy', price=100, category=self.phones)
+        self.case = Product.objects.create(name='Case', price=10, category=self.phones)
+        self.first = place_order({str(self.phone.id): 1, str(self.case.id): 2}, self.customer)
+        self.second = place_order({str(self.case.id): 1}, self.customer)
+        self.today = timezone.localdate()
+
+    def test_rollups_sum_the_day(self):
+        self.assertEqual(refresh_sales_rollups(), 1)
+        day = DailySales.objects.get(date=self.today)
+        self.assertEqual((day.order_count, day.units, day.revenue), (2, 4, 130))
+        self.assertEqual(
+            dict(DailyProductSales.objects.values_list('product_name', 'units')), {'Galaxy': 1, 'Case': 3}
+        )
+        self.assertEqual(DailyProductSales.objects.filter(category=self.phones).count(), 2)
+
+    def test_only_changed_days_are_rebuilt(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        Order.objects.filter(pk=self.second.pk).update(created_at=yesterday, updated_at=yesterday)
+        self.assertEqual(refresh_sales_rollups(), 2)
+        self.assertEqual(refresh_sales_rollups(), 1)  # the overlap window re-reads today only
+
+        self.first.status = 'cancelled'
+        self.first.save()
+        refresh_sales_rollups()
+        day = DailySales.objects.get(date=self.today)
+        self.assertEqual((day.order_count, day.revenue), (0, 0))
+        self.assertFalse(DailyProductSales.objects.filter(date=self.today).exists())
+        self.assertEqual(DailyStatusSales.objects.get(date=self.today).status, 'cancelled')
+        self.assertEqual(DailySales.objects.get(date=self.today - timedelta(days=1)).revenue, 10)
+
+    def test_dashboard_reads_only_rollups(self):
+        refresh_sales_rollups()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:store_dailysales_changelist'), {'days': 7})
+        self.assertContains(response, 'Galaxy')
+        self.assertFalse([q for q in queries.captured_queries if 'store_order' in q['sql']])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.phones = Category.objects.create(name='Phones')
+        self.samsung = Brand.objects.create(name='Samsung')
+
+    def add_products(self, count):
+        for i in range(count):
+            category = Category.objects.create(name=f'Category {Product.objects.count()}')
+            Product.objects.create(name=f'Phone {Product.objects.count()}', price=10, category=category, brand=self.samsung)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_product_changelist_query_count_is_flat(self):
+        url = reverse('admin:store_product_changelist')
+        self.add_products(2)
+        few = self.changelist_queries(url)
+        self.add_products(20)
+        self.assertEqual(self.changelist_queries(url), few)
+
+    def test_order_changelist_shows_item_counts(self):
+        product = Product.objects.create(name='Galaxy', price=10, category=self.phones)
+        customer = PlaceOrderTests.customer
+        place_order({str(product.id): 3}, customer)
+        url = reverse('admin:store_order_changelist')
+        few = self.changelist_queries(url)
+        for _ in range(10):
+            place_order({str(product.id): 1}, customer)
+        self.assertEqual(self.changelist_queries(url), few)
+        response = self.client.get(url, {'o': '3'})
+        self.assertContains(response, 'field-item_count')
+
+    def test_bulk_delete_from_order_changelist(self):
+        product = Product.objects.create(name='Galaxy', price=10, category=self.phones)
+        order = place_order({str(product.id): 1}, PlaceOrderTests.customer)
+        self.client.post(reverse('admin:store_order_changelist'), {
+            'action': 'delete_selected', '_selected_action': [order.pk], 'post': 'yes',
+        })
+        self.assertFalse(Order.objects.exists())
+
+    def test_small_tables_are_counted_exactly(self):
+        self.add_products(3)
+        self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('id'), 10).count, 3)
+
+
+class OrderSearchTests(TestCase):
+    def setUp(self):
+        self.jane = self.order('ORD-1A2B3C4D', 'Jane Otieno', 'jane.otieno@example.com', '0712 345 678')
+        self.john = self.order('ORD-9F8E7D6C', 'John Kamau', 'jk@example.com', '+254 733-111222')
+
+    def order(self, number, name, email, phone):
+        return Order.objects.create(order_number=number, customer_name=name, customer_email=email,
+                                    customer_phone=phone, customer_address='Nairobi', total_amount=100)
+
+    def search(self, query):
+        return set(search_orders(Order.objects.all(), query))
+
+    def test_phone_is_normalized(self):
+        for phone in ('0712345678', '+254712345678', '254712345678', '712 345 678', '(0712) 345-678'):
+            with self.subTest(phone=phone):
+                self.assertEqual(Order.normalize_phone(phone), '712345678')
+        self.assertEqual(self.john.phone_digits, '733111222')
+
+    def test_finds_orders_by_any_form_of_phone(self):
+        for query in ('0712 345 678', '+2547123', '712345', '345 678', '254733111222'):
+            with self.subTest(query=query):
+                expected = {self.john} if '733' in query else {self.jane}
+                self.assertEqual(self.search(query), expected)
+
+    def test_finds_orders_by_name_email_and_number_fragments(self):
+        self.assertEqual(self.search('otie'), {self.jane})
+        self.assertEqual(self.search('JANE otieno'), {self.jane})
+        self.assertEqual(self.search('jk@exa'), {self.john})
+        self.assertEqual(self.search('ord-9f8'), {self.john})
+        self.assertEqual(self.search('example.com'), {self.jane, self.john})
+        self.assertEqual(self.search('jane kamau'), set())
+
+    def test_unindexed_fallback_agrees(self):
+        for query in ('0712 345 678', 'otie', 'JANE otieno', 'ord-9f8', 'example.com', 'ja'):
+            with self.subTest(query=query):
+                self.assertEqual(set(BasicOrderSearchBackend().search(Order.objects.all(), query)), self.search(query))
+
+    def test_short_and_syntax_queries_match_nothing(self):
+        self.assertEqual(self.search('ja'), set())
+        self.assertEqual(self.search('07'), set())
+        self.assertEqual(self.search('"jane" OR *'), set())
+
+    def test_index_follows_saves_and_deletes(self):
+        self.jane.customer_phone = '0799 000 111'
+        self.jane.customer_name = 'Jane Wanjiru'
+        self.jane.save()
+        self.assertEqual(self.search('0799000'), {self.jane})
+        self.assertEqual(self.search('0712345'), set())
+        self.assertEqual(self.search('wanjiru'), {self.jane})
+        self.john.delete()
+        self.assertEqual(self.search('kamau'), set())
+
+    def test_status_saves_skip_the_index(self):
+        self.jane.status = 'shipped'
+        with CaptureQueriesContext(connection) as queries:
+            self.jane.save(update_fields=['status'])
+        self.assertFalse([q for q in queries if ORDER_FTS_TABLE in q['sql']])
+        self.jane.customer_phone = '0799 000 111'
+        self.jane.save(update_fields=['customer_phone'])
+        self.assertEqual(self.search('0799000'), {self.jane})
+
+    def test_seeded_orders_are_searchable(self):
+        Seeder(seed=3, days=30).seed_products(5)
+        Seeder(seed=3, days=30).seed_orders(5)
+        seeded = Order.objects.filter(order_number__startswith='SEED').first()
+        self.assertIn(seeded, self.search(seeded.customer_phone))
+        self.assertIn(seeded, self.search(seeded.customer_name))
+
+    def test_admin_changelist_and_lookup(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get(reverse('admin:store_order_changelist'), {'q': '0712345678'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.jane])
+        self.assertContains(response, reverse('admin:store_order_lookup'))
+
+        response = self.client.get(reverse('admin:store_order_lookup'), {'q': 'kamau'})
+        self.assertContains(response, 'ORD-9F8E7D6C')
+        self.assertNotContains(response, 'ORD-1A2B3C4D')
+
+    def test_lookup_is_staff_only(self):
+        response = self.client.get(reverse('admin:store_order_lookup'), {'q': 'kamau'})
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(User.objects.create_user('clerk', password='pw', is_staff=True))
+        self.assertEqual(self.client.get(reverse('admin:store_order_lookup')).status_code, 403)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SpecificationFilterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.laptops = Category.objects.create(name='Laptops')
+        self.small = Product.objects.create(
+            name='Air', price=100, category=self.laptops, specifications={'RAM': '8GB', 'Storage': '256GB'},
+        )
+        self.big = Product.objects.create(
+            name='Pro', price=200, category=self.laptops, specifications={'RAM': '16GB', 'Storage': '512GB'},
+        )
+        self.bigger = Product.objects.create(
+            name='Max', price=300, category=self.laptops, specifications={'ram': '32GB', 'Storage': '512GB'},
+        )
+
+    def test_parse_text_specifications(self):
+        text = '- RAM: 16GB\nStorage:\t512GB SSD\nBacklit keyboard\n\nFingerprint reader'
+        self.assertEqual(parse_specifications(text), {
+            'RAM': '16GB', 'Storage': '512GB SSD', 'Features': 'Backlit keyboard\nFingerprint reader',
+        })
+        self.assertEqual(parse_specifications('{"RAM": 16, "Ports": ["USB-C", "HDMI"]}'), {
+            'RAM': '16', 'Ports': 'USB-C, HDMI',
+        })
+        self.assertEqual(parse_specifications(None), {})
+
+    def test_attributes_follow_product_saves(self):
+        self.small.specifications = {'RAM': '12GB'}
+        self.small.save()
+        self.assertEqual(list(self.small.attributes.values_list('key', 'value')), [('ram', '12GB')])
+
+    def test_shop_filters_by_attribute(self):
+        response = self.client.get(reverse('shop'), {'category': 'laptops', 'storage': '512GB', 'ram': ['16GB', '32GB']})
+        self.assertEqual(set(response.context['page_obj']), {self.big, self.bigger})
+        response = self.client.get(reverse('shop'), {'ram': '16GB', 'utm_source': 'mail'})
+        self.assertEqual(list(response.context['page_obj']), [self.big])
+        self.assertEqual(response.context['facets']['categories'][0][1], 1)
+
+    def test_specs_named_like_shop_parameters_get_their_own_key(self):
+        self.small.specifications = {'Brand': 'Generic', 'Sort': 'Ultrabook'}
+        self.small.save()
+        self.assertEqual(set(self.small.attributes.values_list('key', flat=True)), {'brand-spec', 'sort-spec'})
+        response = self.client.get(reverse('shop'), {'category': 'laptops', 'brand-spec': 'Generic'})
+        self.assertEqual(list(response.context['page_obj']), [self.small])
+        self.assertContains(response, 'name="brand-spec" value="Generic"')
+
+    def test_attribute_options_for_category(self):
+        response = self.client.get(reverse('shop'), {'category': 'laptops', 'ram': '8GB'})
+        options = {key: values for name, key, values in response.context['facets']['attributes']}
+        self.assertEqual(options['ram'], [('16GB', 1, False), ('32GB', 1, False), ('8GB', 1, True)])
+        # Other attributes count only the 8GB products, as the list shows
+        self.assertEqual(options['storage'], [('256GB', 1, False)])
+        self.assertContains(response, 'name="storage" value="256GB"')
+
+    def test_option_counts_apply_every_other_attribute_filter(self):
+        ProductAttribute.objects.create(product=self.bigger, key='colour', name='Colour', value='Grey')
+        filters = {'category': 'laptops'}
+        with self.assertNumQueries(3):
+            rows = attribute_option_rows(filters, {'storage': ['512GB'], 'colour': ['Grey']})
+        counts = {(row['key'], row['value']): row['count'] for row in rows}
+        self.assertEqual(counts, {
+            ('colour', 'Grey'): 1,
+            ('ram', '32GB'): 1,
+            ('storage', '512GB'): 1,
+        })
+        with self.assertNumQueries(2):
+            rows = attribute_option_rows(filters, {'storage': ['512GB']})
+        counts = {(row['key'], row['value']): row['count'] for row in rows}
+        self.assertEqual(counts, {
+            ('colour', 'Grey'): 1,
+            ('ram', '16GB'): 1, ('ram', '32GB'): 1,
+            ('storage', '256GB'): 1, ('storage', '512GB'): 2,
+        })
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(name='Galaxy', price=10)
+
+    def test_request_is_logged_with_its_work(self):
+        with self.assertLogs('store.performance', 'INFO') as logs:
+            response = self.client.get(reverse('shop'))
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['url_name'], line['status']), ('shop', 200))
+        self.assertGreater(line['queries'], 0)
+        self.assertGreater(line['template_ms'], 0)
+        self.assertGreater(line['cache_misses'], 0)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(DEBUG=True)
+    def test_server_timing_header(self):
+        with self.assertLogs('store.performance', 'INFO'):
+            self.client.get(reverse('shop'))
+            response = self.client.get(reverse('shop'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(timing, r'cache;dur=[\d.]+;desc="[1-9]\d* hits')
+        self.assertIn('total;dur=', timing)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_flagged(self):
+        with self.assertLogs('store.performance', 'WARNING') as logs:
+            self.client.get(reverse('shop'))
+        self.assertIn('Slow query', logs.output[0])
+
+    def test_repeated_sql_is_reported(self):
+        metrics = RequestMetrics()
+        metrics.queries = [('SELECT 1 WHERE id = %s', 1.0)] * 5 + [('SELECT 2', 1.0)]
+        self.assertEqual(metrics.repeated_queries(5), [('SELECT 1 WHERE id = %s', 5)])
+        self.assertEqual(metrics.db_ms, 6.0)
+
+
+class AsyncURLConf:
+    urlpatterns = build_urlpatterns(async_views=True)
+
+
+@override_settings(STORAGES=TEST_STORAGES, ROOT_URLCONF=AsyncURLConf)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Phones')
+        self.product = Product.objects.create(name='Galaxy', price=100, category=self.category,
+                                              is_featured=True, specifications={'RAM': '8GB'})
+        self.related = Product.objects.create(name='Galaxy Case', price=10, category=self.category)
+        self.order = Order.objects.create(order_number='BDS-ASYNC', customer_name='Wanjiru',
+                                          customer_email='w@example.com', customer_phone='0700000000',
+                                          customer_address='Nairobi', payment_method='mpesa', total_amount=100)
+        self.async_client = AsyncClient()
+
+    async def test_pages_render(self):
+        for url, text in [
+            (reverse('home'), 'Galaxy'),
+            (reverse('shop') + '?q=galaxy', 'Galaxy Case'),
+            (reverse('product_detail', args=[self.product.slug]), 'Galaxy Case'),
+            (reverse('order_confirmation', args=[self.order.order_number]), 'BDS-ASYNC'),
+        ]:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertContains(response, text)
+
+    async def test_missing_rows_are_404(self):
+        for url in [reverse('product_detail', args=['nope']), reverse('order_confirmation', args=['nope'])]:
+            with self.subTest(url=url):
+                self.assertEqual((await self.async_client.get(url)).status_code, 404)
+
+    async def test_product_repeat_visit_gets_304(self):
+        url = reverse('product_detail', args=[self.product.slug])
+        await self.async_client.get(url)  # first visit sets the CSRF cookie
+        response = await self.async_client.get(url)
+        response = await self.async_client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_async_views_keep_sync_query_counts(self):
+        for name, args in [('home', []), ('product_detail', [self.product.slug])]:
+            with self.subTest(route=name):
+                cache.clear()
+                with self.settings(ROOT_URLCONF='config.urls'), CaptureQueriesContext(connection) as sync_queries:
+                    self.client.get(reverse(name, args=args))
+                cache.clear()
+                with CaptureQueriesContext(connection) as async_queries:
+                    self.client.get(reverse(name, args=args))
+                self.assertEqual(len(async_queries), len(sync_queries))
+
+@skipUnless('replica' in settings.DATABASES, 'needs a replica alias, e.g. --settings=config.settings_test')
+@override_settings(STORAGES=TEST_STORAGES, READ_REPLICA_DATABASE='replica')
+class ReadReplicaRoutingTests(TransactionTestCase):
+    # 'replica' mirrors the default test database (see config.settings_test), so
+    # both aliases see the same rows through separate connections. The runner
+    # sets up the databases of skipped classes too, so only ask for it if it's there.
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Galaxy', price=100)
+
+    def queries_by_alias(self, func):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            func()
+        return len(primary), len(replica)
+
+    def test_catalogue_reads_use_replica_and_orders_primary(self):
+        self.assertEqual(router.db_for_read(Product), 'replica')
+        self.assertEqual(router.db_for_read(Order), 'default')
+        self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertEqual(Product.objects.get(pk=self.product.pk)._state.db, 'replica')
+
+    def test_transactions_and_pinned_blocks_read_primary(self):
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Product), 'default')
+        with use_primary():
+            self.assertEqual(router.db_for_read(Product), 'default')
+        self.assertEqual(router.db_for_read(Product), 'replica')
+
+    def test_shop_is_served_from_replica(self):
+        primary, replica = self.queries_by_alias(lambda: self.client.get(reverse('shop')))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_benchmarks_count_replica_queries(self):
+        primary, replica = self.queries_by_alias(lambda: self.client.get(reverse('shop')))
+        cache.clear()
+        status, elapsed, queries = measure(self.client, reverse('shop'))
+        self.assertEqual(queries, primary + replica)
+        self.assertGreater(queries, 0)
+
+    def test_client_reads_primary_after_writing(self):
+        response = self.client.post(reverse('cart'), {'action': 'add', 'product_id': self.product.id, 'quantity': 1})
+        self.assertIn('store_primary', response.cookies)
+        primary, replica = self.queries_by_alias(lambda: self.client.get(reverse('shop')))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    def test_order_confirmation_follows_checkout(self):
+        self.client.post(reverse('cart'), {'action': 'add', 'product_id': self.product.id, 'quantity': 2})
+        self.client.cookies.pop('store_primary')
+        response = self.client.post(reverse('checkout'), {
+            'customer_name': 'Jane', 'phone': '0712345678', 'location': 'Nairobi', 'payment_method': 'cod',
+        }, follow=True)
+        self.assertContains(response, Order.objects.get().order_number)
+
+    @override_settings(READ_REPLICA_DATABASE=None)
+    def test_without_replica_everything_reads_primary(self):
+        self.assertEqual(router.db_for_read(Product), 'default')
+        response = self.client.post(reverse('cart'), {'action': 'add', 'product_id': self.product.id, 'quantity': 1})
+        self.assertNotIn('store_primary', response.cookies)
+
+class StaticBundleTests(TestCase):
+    def test_minify_css(self):
+        css = '/* tokens */\n:root {\n    --gap: 1rem;\n}\n\n.nav-link > a,\n.btn { color: red; }\n'
+        self.assertEqual(minify_css(css), ':root{--gap:1rem}.nav-link>a,.btn{color:red}')
+
+    def test_minify_js_keeps_template_literals(self):
+        js = '// setup\n/**\n * docs\n */\nfunction f() {\n    const html = `\n    // not a comment\n    `;\n    return html;\n}\n'
+        self.assertEqual(minify_js(js), 'function f() {\nconst html = `\n    // not a comment\n    `;\nreturn html;\n}\n')
+
+    def test_critical_css_keeps_first_screen_rules(self):
+        css = minify_css(
+            '.nav-header{top:0}.product-card{margin:0}.hero{animation:fadeIn 1s}'
+            '@media (max-width: 768px){.nav-menu{display:none}.footer{padding:0}}'
+            '@keyframes fadeIn{from{opacity:0}}@keyframes spin{to{rotate:1turn}}'
+        )
+        self.assertEqual(
+            critical_css(css),
+            '.nav-header{top:0}.hero{animation:fadeIn 1s}@media (max-width:768px){.nav-menu{display:none}}'
+            '@keyframes fadeIn{from{opacity:0}}',
+        )
+
+    def test_collectstatic_builds_compressed_bundles(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        storages = {**TEST_STORAGES, 'staticfiles': {'BACKEND': 'store.assets.BundledStaticFilesStorage'}}
+        with self.settings(STATIC_ROOT=static_root, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['admin'])
+            with open(os.path.join(static_root, 'staticfiles.json')) as f:
+                bundle = json.load(f)['paths']['store/assets/css/site.css']
+            for suffix in ('', '.gz', '.br'):
+                self.assertTrue(os.path.exists(os.path.join(static_root, bundle + suffix)))
+
+            response = self.client.get(reverse('about'))
+            self.assertContains(response, '<style>:root{')
+            self.assertContains(response, bundle)
+            self.assertNotContains(response, 'design-system')
+
+            response = self.client.get(f'/static/{bundle}', HTTP_ACCEPT_ENCODING='br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertIn('immutable', response['Cache-Control'])
+
+@override_settings(STORAGES=TEST_STORAGES, SITE_URL='https://shop.example.com')
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        phones = Category.objects.create(name='Phones')
+        self.products = [
+            Product.objects.create(name=f'Galaxy {i}', price=100 + i, category=phones,
+                                   stock_quantity=0 if i == 3 else None, allow_preorder=True)
+            for i in range(4)
+        ]
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_sitemap_index_and_shards(self):
+        response, index = self.get(reverse('sitemap'))
+        shard_url = reverse('sitemap_products', args=[self.products[0].id // feeds.SHARD_SIZE])
+        self.assertIn(f'https://shop.example.com{shard_url}</loc><lastmod>', index)
+        self.assertIn(reverse('sitemap_pages'), index)
+
+        response, urlset = self.get(shard_url)
+        self.assertEqual(urlset.count('<url>'), 4)
+        self.assertIn(f'https://shop.example.com/product/{self.products[0].slug}/', urlset)
+        self.assertIn('?category=phones', self.get(reverse('sitemap_pages'))[1])
+        self.assertEqual(self.client.get(reverse('sitemap_products', args=[999])).status_code, 404)
+
+    def test_merchant_feed_formats(self):
+        response, xml = self.get(reverse('product_feed'))
+        self.assertEqual(response['Content-Type'], 'application/rss+xml; charset=utf-8')
+        self.assertEqual(xml.count('<item>'), 4)
+        self.assertIn('<g:price>103.00 KES</g:price>', xml)
+        self.assertIn('<g:availability>preorder</g:availability>', xml)
+
+        response, text = self.get(reverse('product_feed_csv'))
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual([row['title'] for row in rows], [f'Galaxy {i}' for i in range(4)])
+        self.assertEqual(rows[0]['product_type'], 'Phones')
+
+    def test_only_changed_shards_are_rebuilt(self):
+        with mock.patch.object(feeds, 'SHARD_SIZE', 2), \
+                mock.patch.object(feeds, 'feed_rows', wraps=feeds.feed_rows) as feed_rows:
+            first = self.get(reverse('product_feed'))[1]
+            self.assertEqual(feed_rows.call_count, len({p.id // 2 for p in self.products}))
+
+            feed_rows.reset_mock()
+            self.assertEqual(self.get(reverse('product_feed'))[1], first)
+            feed_rows.assert_not_called()
+
+            changed = self.products[-1]
+            changed.price = 999
+            changed.save()
+            self.assertIn('999.00 KES', self.get(reverse('product_feed'))[1])
+            feed_rows.assert_called_once_with('https://shop.example.com', changed.id // 2)
+
+    def test_host_header_does_not_change_links_or_cache(self):
+        first = self.get(reverse('product_feed'))[1]
+        with mock.patch.object(feeds, 'feed_rows') as feed_rows:
+            response = self.client.get(reverse('product_feed'), HTTP_HOST='127.0.0.1')
+            self.assertEqual(b''.join(response.streaming_content).decode(), first)
+        feed_rows.assert_not_called()
+        self.assertNotIn('127.0.0.1', first)
+
+    async def test_async_views_stream_from_an_async_iterator(self):
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            response = await AsyncClient().get(reverse('sitemap_products', args=[self.products[0].id // feeds.SHARD_SIZE]))
+            self.assertTrue(response.is_async)
+            urlset = b''.join([chunk async for chunk in response.streaming_content]).decode()
+            self.assertEqual(urlset.count('<url>'), 4)
+            response = await AsyncClient().get(reverse('sitemap_products', args=[999]))
+            self.assertEqual(response.status_code, 404)
+
+# A background rebuild would read the database outside the test's transaction
+@override_settings(STORAGES=TEST_STORAGES, TYPEAHEAD_BACKGROUND_REBUILD=False)
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        phones = Category.objects.create(name='Phones')
+        samsung = Brand.objects.create(name='Samsung')
+        self.galaxy = Product.objects.create(name='Samsung Galaxy A15', price=20000, category=phones, brand=samsung)
+        Product.objects.create(name='Galaxy Buds Café', price=9000, category=phones, brand=samsung)
+        Product.objects.create(name='Phone Case', price=500, stock_quantity=0)
+
+    def names(self, query):
+        return [item['name'] for item in typeahead.suggest(query)]
+
+    def test_matches_word_prefixes(self):
+        self.assertEqual(self.names('sams'), ['Samsung', 'Samsung Galaxy A15'])
+        self.assertEqual(self.names('galaxy'), ['Galaxy Buds Café', 'Samsung Galaxy A15'])
+        self.assertEqual(self.names('GALAXY a1'), ['Samsung Galaxy A15'])
+        self.assertEqual(self.names('cafe'), ['Galaxy Buds Café'])
+        self.assertEqual(self.names('ph'), ['Phones', 'Phone Case'])
+        self.assertEqual(self.names('s'), [])
+
+    def test_endpoint_is_served_from_memory(self):
+        self.client.get(reverse('search_suggestions'), {'q': 'ga'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('search_suggestions'), {'q': 'galaxy a'})
+        [suggestion] = response.json()
+        self.assertEqual(suggestion['url'], reverse('product_detail', args=[self.galaxy.slug]))
+        self.assertEqual((suggestion['kind'], suggestion['category'], suggestion['price']), ('product', 'Phones', 20000))
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    def test_index_is_rebuilt_when_catalogue_changes(self):
+        index = typeahead.get_index()
+        self.assertIs(typeahead.get_index(), index)
+        self.galaxy.name = 'Samsung Galaxy A25'
+        self.galaxy.save()
+        self.assertEqual(self.names('galaxy a'), ['Samsung Galaxy A25'])
+        self.assertIsNot(typeahead.get_index(), index)
+
+    @override_settings(TYPEAHEAD_BACKGROUND_REBUILD=True)
+    def test_stale_index_answers_while_rebuilt_in_background(self):
+        typeahead.rebuild()
+        self.galaxy.name = 'Samsung Galaxy A25'
+        self.galaxy.save()
+        with mock.patch('store.typeahead.threading.Thread') as thread, self.assertNumQueries(0):
+            self.assertEqual(self.names('galaxy a'), ['Samsung Galaxy A15'])
+            self.assertEqual(self.names('galaxy a'), ['Samsung Galaxy A15'])
+        thread.assert_called_once()
+        # What the thread runs, here in the test's transaction
+        with mock.patch('store.typeahead.connections.close_all'):
+            typeahead._rebuild_in_background(*thread.call_args.kwargs['args'])
+        self.assertEqual(self.names('galaxy a'), ['Samsung Galaxy A25'])
+
+    def test_brands_and_categories_match_past_the_product_window(self):
+        items = [{'kind': 'product', 'name': f'Sa{i:04d} Phone'} for i in range(typeahead.MAX_CANDIDATES * 2)]
+        items += [{'kind': 'brand', 'name': 'Samsung'}, {'kind': 'category', 'name': 'Smart Watches'}]
+        index = typeahead.TypeaheadIndex(version=0, items=items)
+        self.assertEqual([item['name'] for item in index.suggest('sa')][:1], ['Samsung'])
+        self.assertEqual([item['name'] for item in index.suggest('s')], [])
+        self.assertEqual([item['name'] for item in index.suggest('sm')], ['Smart Watches'])
+
+    def test_lookup_is_fast_on_a_large_catalogue(self):
+        items = [{'kind': 'product', 'name': f'Brand{i % 50} Model {i} Pro'} for i in range(50000)]
+        index = typeahead.TypeaheadIndex(version=0, items=items)
+        start = time.perf_counter()
+        for query in ['br', 'brand1', 'model 4', 'pro', 'mo'] * 20:
+            index.suggest(query)
+        self.assertLess((time.perf_counter() - start) / 100, 0.005)
+
+# Most queries each route may run against a cold cache. A view that starts
+# querying per product, per category or per order item blows through these
+# with the seeded data below.
+class WarmupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Phones')
+        Product.objects.create(name='Galaxy', price=100, category=self.category)
+
+    def test_compiles_every_store_template(self):
+        engine = engines['django'].engine
+        loader = engine.template_loaders[0]
+        loader.reset()
+        self.assertEqual(compile_templates(), len(store_templates()))
+        self.assertIn('store/base.html', store_templates())
+        with mock.patch('django.template.loaders.filesystem.Loader.get_contents', side_effect=AssertionError('read from disk')):
+            engine.get_template('store/product_detail.html')
+
+    def test_primes_caches_and_closes_connections(self):
+        timings = warm_up()
+        self.assertEqual(set(timings), {'templates', 'urls', 'caches', 'typeahead'})
+        with self.assertNumQueries(0):
+            get_site_settings()
+            get_nav_categories()
+            get_nav_brands()
+            typeahead.suggest('gal')
+
+    def test_command_reports_each_step(self):
+        out = io.StringIO()
+        call_command('warmup', stdout=out)
+        self.assertIn('typeahead', out.getvalue())
+        self.assertIn('Warmed up in', out.getvalue())
+
+
+QUERY_BUDGETS = {
+    'home': 1,
+    'shop': 3,
+    'product_detail': 4,
+    'cart': 3,
+    'checkout': 1,
+    'order_confirmation': 1,
+    'about': 0,
+    'contact': 0,
+    'privacy': 0,
+    'terms': 0,
+    'warranty': 0,
+    'register': 0,
+    'login': 0,
+    'logout': 2,
+    'shop:category': 4,
+    'shop:search': 3,
+    'shop:price': 3,
+    'cart_badge': 1,
+    'search_suggestions': 3,
+    'sitemap': 1,
+    'sitemap_pages': 2,
+    'sitemap_products': 2,
+    'product_feed': 4,
+    'product_feed_csv': 1,
+}
+
+
+@override_settings(STORAGES=TEST_STORAGES, TYPEAHEAD_BACKGROUND_REBUILD=False)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seeder = Seeder(seed=7, days=30, batch_size=50)
+        seeder.seed_products(60)
+        seeder.seed_orders(40)
+        # Enough featured products to fill the home page grid
+        featured = Product.objects.order_by('id').values_list('id', flat=True)[:8]
+        Product.objects.filter(id__in=list(featured)).update(is_featured=True, stock_quantity=10, stock_status='in_stock')
+
+    def setUp(self):
+        cache.clear()
+        fill_cart(self.client)
+
+    def test_shop_variants_use_known_sorts(self):
+        with mock.patch.dict(SHOP_VARIANTS, {'shop:typo': lambda product: {'sort': 'price_low'}}):
+            with self.assertRaisesMessage(ValueError, 'price_low'):
+                route_targets()
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual({name for name, path in route_targets()} - QUERY_BUDGETS.keys(), set())
+
+    def test_views_stay_within_query_budget(self):
+        for name, path in route_targets():
+            with self.subTest(route=name):
+                self.assertIsNotNone(path)
+                status, elapsed, queries = measure(self.client, path)
+                self.assertLess(status, 400)
+                self.assertLessEqual(queries, QUERY_BUDGETS[name])
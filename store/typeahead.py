@@ -0,0 +1,169 @@
+import logging
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+from .cache import get_catalog_version
+from .models import Brand, Category, Product
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY_LENGTH = 2
+MAX_SUGGESTIONS = 8
+# Product prefix matches looked at per query before ranking; keeps a short
+# query over a large catalogue as cheap as a specific one. Brands and
+# categories are few, so all of their matches are always looked at.
+MAX_CANDIDATES = 200
+
+# Brands and categories rank above products with the same match
+KIND_ORDER = {'brand': 0, 'category': 1, 'product': 2}
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize(text):
+    """'Café  Crème-Pro' -> 'cafe creme pro'"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+class TypeaheadIndex:
+    """
+    Sorted arrays of normalised names, one per kind of item, with one entry
+    per word position ('samsung galaxy a15', 'galaxy a15', 'a15'), so a query
+    matches the start of any word with a bisect and a short scan. Read-only
+    once built; a new catalogue version gets a new index.
+    """
+
+    def __init__(self, version, items):
+        self.version = version
+        self.items = items
+        entries = {kind: [] for kind in KIND_ORDER}
+        for ref, item in enumerate(items):
+            words = normalize(item['name']).split()
+            for position in range(len(words)):
+                entries[item['kind']].append((' '.join(words[position:]), position, ref))
+        # kind -> (keys, [(position, ref), ...])
+        self.sections = {}
+        for kind, section in entries.items():
+            section.sort()
+            self.sections[kind] = (
+                [key for key, position, ref in section],
+                [(position, ref) for key, position, ref in section],
+            )
+
+    @classmethod
+    def build(cls, version):
+        items = [
+            {'kind': 'brand', 'name': name, 'url': f"{reverse('shop')}?brand={slug}"}
+            for name, slug in Brand.objects.order_by().values_list('name', 'slug')
+        ] + [
+            {'kind': 'category', 'name': name, 'url': f"{reverse('shop')}?category={slug}"}
+            for name, slug in Category.objects.order_by().values_list('name', 'slug')
+        ]
+        prefix, suffix = reverse('product_detail', args=['slug']).rsplit('slug', 1)
+        image_url = Product._meta.get_field('image').storage.url
+        products = Product.objects.order_by().values_list(
+            'name', 'slug', 'price', 'image', 'category__name', 'stock_status',
+        )
+        for name, slug, price, image, category, stock_status in products.iterator(chunk_size=2000):
+            items.append({
+                'kind': 'product',
+                'name': name,
+                'url': f'{prefix}{slug}{suffix}',
+                'slug': slug,
+                'price': float(price),
+                'image': image_url(image) if image else None,
+                'category': category or '',
+                'in_stock': stock_status != 'out_of_stock',
+            })
+        return cls(version, items)
+
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        query = normalize(query)
+        if len(query) < MIN_QUERY_LENGTH:
+            return []
+        best = {}
+        for kind, (keys, entries) in self.sections.items():
+            start = bisect_left(keys, query)
+            end = min(start + MAX_CANDIDATES, len(keys)) if kind == 'product' else len(keys)
+            for i in range(start, end):
+                if not keys[i].startswith(query):
+                    break
+                position, ref = entries[i]
+                # Keep each item's best match: a match on the first word beats one further in
+                if ref not in best or position < best[ref]:
+                    best[ref] = position
+        ranked = sorted(best, key=lambda ref: (
+            KIND_ORDER[self.items[ref]['kind']],
+            best[ref] > 0,
+            not self.items[ref].get('in_stock', True),
+            len(self.items[ref]['name']),
+            self.items[ref]['name'],
+        ))
+        return [self.items[ref] for ref in ranked[:limit]]
+
+
+_index = None
+_lock = threading.Lock()
+# Catalogue version a rebuild has been started for
+_rebuilding = None
+
+
+def rebuild(version=None):
+    """Builds this worker's index for the current catalogue version now."""
+    global _index
+    _index = TypeaheadIndex.build(get_catalog_version() if version is None else version)
+    return _index
+
+
+def _rebuild_in_background(version):
+    global _index, _rebuilding
+    try:
+        index = TypeaheadIndex.build(version)
+        with _lock:
+            # A rebuild for a later version may have finished first
+            if _index is None or _index.version < version:
+                _index = index
+    except Exception:
+        logger.exception('Could not rebuild the typeahead index')
+    finally:
+        with _lock:
+            if _rebuilding == version:
+                _rebuilding = None
+        # This thread's own connections, which nothing else would close
+        connections.close_all()
+
+
+def get_index():
+    """
+    This worker's index. Built on first use (the gunicorn master builds it
+    before forking, see store.warmup); after that, a change of catalogue
+    version starts a rebuild in a background thread and the current index
+    keeps answering until it's done, so no request waits on the scan. Only
+    the version lookup (a cache read) happens per query.
+    """
+    global _rebuilding
+    index = _index
+    if index is None:
+        with _lock:
+            return _index or rebuild()
+    version = get_catalog_version()
+    if index.version != version:
+        if not getattr(settings, 'TYPEAHEAD_BACKGROUND_REBUILD', True):
+            return rebuild(version)
+        with _lock:
+            if _rebuilding != version:
+                _rebuilding = version
+                threading.Thread(target=_rebuild_in_background, args=(version,), daemon=True).start()
+    return index
+
+
+def suggest(query, limit=MAX_SUGGESTIONS):
+    return get_index().suggest(query, limit)
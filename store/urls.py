@@ -1,19 +1,39 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
-urlpatterns = [
-    path('', views.home, name='home'),
-    path('shop/', views.shop, name='shop'),
-    path('product/<slug:slug>/', views.product_detail, name='product_detail'),
-    path('cart/', views.cart, name='cart'),
-    path('checkout/', views.checkout, name='checkout'),
-    path('order-confirmation/<str:order_number>/', views.order_confirmation, name='order_confirmation'),
-    path('about/', views.about, name='about'),
-    path('contact/', views.contact, name='contact'),
-    path('privacy/', views.privacy, name='privacy'),
-    path('terms/', views.terms, name='terms'),
-    path('warranty/', views.warranty, name='warranty'),
-    path('register/', views.register, name='register'),
-    path('login/', views.login_view, name='login'),
-    path('logout/', views.logout_view, name='logout'),
-]
+
+def build_urlpatterns(async_views=False):
+    """
+    The store routes; with ``async_views`` the pages that have an async
+    variant in store.views are served by it.
+    """
+    def view(name):
+        return getattr(views, f'{name}_async') if async_views else getattr(views, name)
+
+    return [
+        path('', view('home'), name='home'),
+        path('shop/', view('shop'), name='shop'),
+        path('product/<slug:slug>/', view('product_detail'), name='product_detail'),
+        path('cart/', views.cart, name='cart'),
+        path('checkout/', views.checkout, name='checkout'),
+        path('order-confirmation/<str:order_number>/', view('order_confirmation'), name='order_confirmation'),
+        path('about/', views.about, name='about'),
+        path('contact/', views.contact, name='contact'),
+        path('privacy/', views.privacy, name='privacy'),
+        path('terms/', views.terms, name='terms'),
+        path('warranty/', views.warranty, name='warranty'),
+        path('register/', views.register, name='register'),
+        path('login/', views.login_view, name='login'),
+        path('logout/', views.logout_view, name='logout'),
+        path('api/cart-badge', views.cart_badge, name='cart_badge'),
+        path('api/search-suggestions', views.search_suggestions, name='search_suggestions'),
+        path('sitemap.xml', view('sitemap_index'), name='sitemap'),
+        path('sitemap-pages.xml', view('sitemap_pages'), name='sitemap_pages'),
+        path('sitemap-products-<int:shard>.xml', view('sitemap_products'), name='sitemap_products'),
+        path('feeds/products.xml', view('product_feed'), {'fmt': 'xml'}, name='product_feed'),
+        path('feeds/products.csv', view('product_feed'), {'fmt': 'csv'}, name='product_feed_csv'),
+    ]
+
+
+urlpatterns = build_urlpatterns(getattr(settings, 'STORE_ASYNC_VIEWS', False))
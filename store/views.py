@@ -1,52 +1,61 @@
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
-from django.db.models import Q
 from django.contrib import messages
 from django.utils.http import urlencode
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
-from .models import Category, Product, Brand, SiteSetting, Order, OrderItem
+from django.utils.cache import patch_cache_control
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import condition
+from django.conf import settings
+from .models import Product, Order
 from .forms import UserRegisterForm
-from .utils import send_order_email
+from .orders import place_order, CheckoutError
+from .cache import get_site_settings, get_nav_categories, get_nav_brands, get_catalog_version
+from .cache import aget_site_settings, aget_nav_categories, aget_nav_brands
+from .search import search_products
+from .pagination import KeysetPaginator, KeysetPage
+from .facets import get_shop_facets
+from .specs import attribute_filters, filter_by_attributes
+from .cart import Cart
+from . import feeds, typeahead
 
 def get_cart_data(request):
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total = 0
-    count = 0
-    
-    products = Product.objects.filter(id__in=cart.keys())
-    product_map = {str(p.id): p for p in products}
-    
-    for product_id, item_data in cart.items():
-        product = product_map.get(str(product_id))
-        if product:
-            quantity = item_data.get('quantity', 0)
-            subtotal = product.price * quantity
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'subtotal': subtotal
-            })
-            total += subtotal
-            count += quantity
-            
+    cart = Cart(request.session)
+    cart_items = cart.lines()
     return {
         'cart_items': cart_items,
-        'total': total,
-        'cart_count': count
+        'total': sum((item['subtotal'] for item in cart_items), 0),
+        'cart_count': cart.count
     }
 
 def get_common_context(request):
-    cart_data = get_cart_data(request)
+    # Nothing per visitor: the cart badge is filled in from cart_badge, so
+    # pages stay cacheable (store.middleware.PageCacheMiddleware)
     return {
-        'settings': {s.setting_key: s.setting_value for s in SiteSetting.objects.all()},
-        'categories': Category.objects.all(),
-        'brands': Brand.objects.all(),
-        'cart_count': cart_data['cart_count']
+        'settings': get_site_settings(),
+        'categories': get_nav_categories(),
+        'brands': get_nav_brands(),
     }
 
+SHOP_PAGE_SIZE = 12
+
+# Every ordering ends in id so keyset cursors always point at a single row
+SHOP_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'price_asc': ('price', 'id'),
+    'price_desc': ('-price', '-id'),
+    'name': ('name', 'id'),
+}
+
 def home(request):
     context = get_common_context(request)
     context.update({
@@ -54,67 +63,123 @@ def home(request):
     })
     return render(request, 'store/home.html', context)
 
-def shop(request):
+def shop_listing(params):
+    """
+    The product grid, pagination and facets for shop(), from its query
+    parameters.
+    """
     products = Product.objects.all()
     
     # Filter by Category
-    category_slug = request.GET.get('category')
+    category_slug = params.get('category')
     if category_slug:
         products = products.filter(category__slug=category_slug)
     
     # Filter by Brand
-    brand_slug = request.GET.get('brand')
+    brand_slug = params.get('brand')
     if brand_slug:
         products = products.filter(brand__slug=brand_slug)
 
     # Filter by Stock Status
-    stock_status = request.GET.get('stock')
+    stock_status = params.get('stock')
     if stock_status:
         products = products.filter(stock_status=stock_status)
         
     # Filter by Price
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
+    min_price = params.get('min_price')
+    max_price = params.get('max_price')
     if min_price:
         products = products.filter(price__gte=min_price)
     if max_price:
         products = products.filter(price__lte=max_price)
         
+    # Filter by specification attributes, e.g. ?ram=16GB
+    products = filter_by_attributes(products, attribute_filters(params))
+
     # Search
-    query = request.GET.get('q')
+    query = params.get('q')
     if query:
-        products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        products = search_products(products, query)
 
     # Sorting
-    sort = request.GET.get('sort')
-    if sort == 'newest':
-        products = products.order_by('-created_at')
-    elif sort == 'price_asc':
-        products = products.order_by('price')
-    elif sort == 'price_desc':
-        products = products.order_by('-price')
-    elif sort == 'name':
-        products = products.order_by('name')
+    sort = params.get('sort')
+    if query and sort not in SHOP_ORDERINGS:
+        ordering = ('-search_rank', '-created_at', '-id') # Best match first
     else:
-        products = products.order_by('-created_at') # Default
+        ordering = SHOP_ORDERINGS.get(sort, SHOP_ORDERINGS['newest'])
+    products = products.order_by(*ordering)
 
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = get_common_context(request)
-    context.update({
+    # Pagination - numbered pages near the start, cursors for Next so deep
+    # pages seek on the listing indexes instead of counting and skipping rows
+    cursor = params.get('cursor')
+    keyset = KeysetPaginator(products, SHOP_PAGE_SIZE, ordering) if ordering in SHOP_ORDERINGS.values() else None
+    if keyset and cursor:
+        page_obj = keyset.page(cursor)
+        next_cursor = page_obj.next_cursor
+    else:
+        paginator = Paginator(products, SHOP_PAGE_SIZE)
+        page_obj = paginator.get_page(params.get('page'))
+        next_cursor = keyset.encode_cursor(page_obj[-1]) if keyset and page_obj.has_next() else None
+
+    pagination_query = params.copy()
+    pagination_query.pop('page', None)
+    pagination_query.pop('cursor', None)
+
+    return {
         'page_obj': page_obj,
+        'is_cursor_page': isinstance(page_obj, KeysetPage),
+        'next_cursor': next_cursor,
+        'pagination_query': pagination_query.urlencode(),
+        'facets': get_shop_facets(params),
         'current_category': category_slug,
         'current_brand': brand_slug,
-    })
+    }
+
+def shop(request):
+    context = get_common_context(request)
+    context.update(shop_listing(request.GET))
     return render(request, 'store/shop.html', context)
 
+def product_freshness(request, slug):
+    """
+    The product's own timestamps, fetched once per request for the ETag.
+    There's deliberately no Last-Modified: the page also depends on the site
+    settings, the catalogue version and the user, which no date captures.
+    """
+    if not hasattr(request, '_product_freshness'):
+        request._product_freshness = Product.objects.filter(slug=slug).values_list(
+            'updated_at', 'category__updated_at', 'brand__updated_at'
+        ).first()
+    return request._product_freshness
+
+def product_etag(request, slug):
+    freshness = product_freshness(request, slug)
+    # Flash messages are one-off, so never answer 304 over them
+    if freshness is None or len(messages.get_messages(request)):
+        return None
+    return hashlib.md5(repr((
+        freshness,
+        get_catalog_version(),
+        sorted(get_site_settings().items()),
+        request.user.pk,
+    )).encode()).hexdigest()
+
+def get_related_products(product):
+    # Frequently bought together (store.recommendations), else same category
+    related_products = list(
+        Product.objects.filter(recommended_by__product=product)
+        .select_related('category', 'brand')
+        .order_by('recommended_by__rank')[:4]
+    )
+    if not related_products:
+        related_products = list(Product.objects.filter(category=product.category).exclude(id=product.id).select_related('category', 'brand')[:4])
+    return related_products
+
+@condition(etag_func=product_etag)
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug)
-    related_products = Product.objects.filter(category=product.category).exclude(id=product.id)[:4]
-    
+    product = get_object_or_404(Product.objects.select_related('category', 'brand'), slug=slug)
+    related_products = get_related_products(product)
+
     context = get_common_context(request)
     context.update({
         'product': product,
@@ -125,32 +190,30 @@ def product_detail(request, slug):
 def cart(request):
     if request.method == 'POST':
         action = request.POST.get('action')
-        product_id = request.POST.get('product_id')
-        cart = request.session.get('cart', {})
+        product_id = request.POST.get('product_id', '')
+        cart = Cart(request.session)
+        try:
+            quantity = int(request.POST.get('quantity', 1))
+        except ValueError:
+            quantity = None
+        if action in ('add', 'update') and (quantity is None or not product_id.isdigit()):
+            messages.error(request, 'Sorry, that cart update could not be made')
+            return redirect('cart')
         
         if action == 'add':
-            quantity = int(request.POST.get('quantity', 1))
-            if product_id in cart:
-                cart[product_id]['quantity'] += quantity
-            else:
-                cart[product_id] = {'quantity': quantity}
+            cart.add(product_id, quantity)
             messages.success(request, 'Product added to cart!')
             
         elif action == 'update':
-            quantity = int(request.POST.get('quantity', 1))
+            cart.set(product_id, quantity)
             if quantity > 0:
-                cart[product_id] = {'quantity': quantity}
                 messages.success(request, 'Cart updated')
-            else:
-                if product_id in cart:
-                    del cart[product_id]
                     
         elif action == 'remove':
-            if product_id in cart:
-                del cart[product_id]
+            if product_id in cart.items:
+                cart.remove(product_id)
                 messages.success(request, 'Item removed from cart')
         
-        request.session['cart'] = cart
         return redirect('cart')
 
     cart_data = get_cart_data(request)
@@ -166,40 +229,23 @@ def checkout(request):
         return redirect('cart')
 
     if request.method == 'POST':
-        # Create Order
-        import uuid
-        order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        
-        order = Order.objects.create(
-            order_number=order_number,
-            customer_name=request.POST.get('customer_name'),
-            customer_phone=request.POST.get('phone'),
-            customer_address=request.POST.get('location'),
-            payment_method=request.POST.get('payment_method', 'whatsapp'),
-            total_amount=cart_data['total'],
-            notes=request.POST.get('notes'),
-            status='pending'
-        )
-        
-        # Create Order Items
-        for item in cart_data['cart_items']:
-            OrderItem.objects.create(
-                order=order,
-                product=item['product'],
-                product_name=item['product'].name,
-                product_price=item['product'].price,
-                quantity=item['quantity'],
-                subtotal=item['subtotal']
-            )
-            
+        try:
+            order = place_order(Cart(request.session).items, {
+                'customer_name': request.POST.get('customer_name'),
+                'customer_phone': request.POST.get('phone'),
+                'customer_address': request.POST.get('location'),
+                'payment_method': request.POST.get('payment_method', 'whatsapp'),
+                'notes': request.POST.get('notes'),
+            })
+        except CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect('cart')
+
         # Clear Cart
-        request.session['cart'] = {}
-        
-        # Send Confirmation Email
-        send_order_email(order)
-        
-        return redirect('order_confirmation', order_number=order_number)
-        
+        Cart(request.session).clear()
+
+        return redirect('order_confirmation', order_number=order.order_number)
+
     context = get_common_context(request)
     context.update(cart_data)
     return render(request, 'store/checkout.html', context)
@@ -207,14 +253,10 @@ def checkout(request):
 def order_confirmation(request, order_number):
     order = get_object_or_404(Order, order_number=order_number)
     
-    # Get WhatsApp Number
-    whatsapp_setting = SiteSetting.objects.filter(setting_key='whatsapp_number').first()
-    whatsapp_number = whatsapp_setting.setting_value if whatsapp_setting else '254701511606'
-    
     context = get_common_context(request)
     context.update({
         'order': order,
-        'whatsapp_number': whatsapp_number
+        'whatsapp_number': context['settings'].get('whatsapp_number') or '254701511606'
     })
     return render(request, 'store/order_confirmation.html', context)
 
@@ -225,8 +267,7 @@ def about(request):
 def contact(request):
     context = get_common_context(request)
     # Get WhatsApp number for the template
-    whatsapp_setting = SiteSetting.objects.filter(setting_key='whatsapp_number').first()
-    context['whatsapp_number'] = whatsapp_setting.setting_value if whatsapp_setting else '254701511606'
+    context['whatsapp_number'] = context['settings'].get('whatsapp_number') or '254701511606'
     return render(request, 'store/contact.html', context)
 
 def privacy(request):
@@ -279,3 +320,159 @@ def logout_view(request):
     logout(request)
     messages.info(request, "You have been logged out.")
     return redirect('home')
+
+
+@never_cache
+def cart_badge(request):
+    """
+    The per-visitor bits of a cached page: the cart badge count, and a CSRF
+    token for its forms (setting the CSRF cookie if there isn't one yet).
+    """
+    return JsonResponse({'count': Cart(request.session).count, 'csrf_token': get_token(request)})
+
+def search_suggestions(request):
+    # Served from this worker's in-memory index (store.typeahead); no
+    # session or database access, so it stays cacheable and fast
+    response = JsonResponse(typeahead.suggest(request.GET.get('q', '')), safe=False)
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+# Sitemaps and the merchant feed are streamed from chunked queries, one
+# cached shard at a time (see store.feeds)
+
+def site_url():
+    # Not the request's Host: every allowed host would get its own cached copy
+    return settings.SITE_URL
+
+def sitemap_index(request):
+    return StreamingHttpResponse(feeds.sitemap_index(site_url()), content_type='application/xml')
+
+def sitemap_pages(request):
+    return StreamingHttpResponse(feeds.sitemap_pages(site_url()), content_type='application/xml')
+
+def sitemap_products(request, shard):
+    content = feeds.sitemap_shard(site_url(), shard)
+    if content is None:
+        raise Http404('No such sitemap')
+    return StreamingHttpResponse(content, content_type='application/xml')
+
+def product_feed(request, fmt):
+    content_type = feeds.FEED_FORMATS[fmt][0]
+    response = StreamingHttpResponse(feeds.product_feed(site_url(), fmt), content_type=content_type)
+    if fmt == 'csv':
+        response['Content-Disposition'] = 'inline; filename="products.csv"'
+    return response
+
+# Async variants, routed instead of their sync namesakes when
+# STORE_ASYNC_VIEWS is on (the ASGI profile, see config/asgi.py). Templates
+# are still rendered in a thread: rendering touches the session, the user and
+# the fragment cache, none of which have async APIs.
+
+async def aget_common_context(request):
+    settings, categories, brands = await asyncio.gather(
+        aget_site_settings(),
+        aget_nav_categories(),
+        aget_nav_brands(),
+    )
+    return {
+        'settings': settings,
+        'categories': categories,
+        'brands': brands,
+    }
+
+async def arender(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """
+    condition() for async views. Django calls the validators inline, where
+    their queries would block the event loop, so they are run in a thread
+    first and handed to condition() as constants.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            def validators():
+                return (
+                    etag_func(request, *args, **kwargs) if etag_func else None,
+                    last_modified_func(request, *args, **kwargs) if last_modified_func else None,
+                )
+            etag, last_modified = await sync_to_async(validators)()
+            conditional = condition(
+                etag_func=lambda *a, **kw: etag,
+                last_modified_func=lambda *a, **kw: last_modified,
+            )(view)
+            return await conditional(request, *args, **kwargs)
+        return inner
+    return decorator
+
+async def home_async(request):
+    featured = Product.objects.filter(is_featured=True, stock_status='in_stock')[:8]
+    context, featured_products = await asyncio.gather(
+        aget_common_context(request),
+        sync_to_async(list)(featured),
+    )
+    context['featured_products'] = featured_products
+    return await arender(request, 'store/home.html', context)
+
+async def shop_async(request):
+    context, listing = await asyncio.gather(
+        aget_common_context(request),
+        sync_to_async(shop_listing)(request.GET),
+    )
+    context.update(listing)
+    return await arender(request, 'store/shop.html', context)
+
+@async_condition(etag_func=product_etag)
+async def product_detail_async(request, slug):
+    try:
+        context, product = await asyncio.gather(
+            aget_common_context(request),
+            Product.objects.select_related('category', 'brand').aget(slug=slug),
+        )
+    except Product.DoesNotExist:
+        raise Http404('No Product matches the given query.')
+    context.update({
+        'product': product,
+        'related_products': await sync_to_async(get_related_products)(product),
+    })
+    return await arender(request, 'store/product_detail.html', context)
+
+async def order_confirmation_async(request, order_number):
+    try:
+        context, order = await asyncio.gather(
+            aget_common_context(request),
+            Order.objects.aget(order_number=order_number),
+        )
+    except Order.DoesNotExist:
+        raise Http404('No Order matches the given query.')
+    context.update({
+        'order': order,
+        'whatsapp_number': context['settings'].get('whatsapp_number') or '254701511606'
+    })
+    return await arender(request, 'store/order_confirmation.html', context)
+
+async def aiterate(iterator):
+    """
+    A sync iterator as an async one, advanced a chunk at a time in a thread.
+    Handing ASGI a sync iterator makes Django read all of it into memory
+    before sending anything.
+    """
+    iterator = iter(iterator)
+    done = object()
+    while (chunk := await sync_to_async(next)(iterator, done)) is not done:
+        yield chunk
+
+def streaming_async(view):
+    """Async variant of a streaming view: run in a thread, streamed from an async iterator."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        response = await sync_to_async(view)(request, *args, **kwargs)
+        response.streaming_content = aiterate(response.streaming_content)
+        return response
+    return inner
+
+sitemap_index_async = streaming_async(sitemap_index)
+sitemap_pages_async = streaming_async(sitemap_pages)
+sitemap_products_async = streaming_async(sitemap_products)
+product_feed_async = streaming_async(product_feed)
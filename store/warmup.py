@@ -0,0 +1,77 @@
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import connections
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.urls import get_resolver
+
+from . import typeahead
+from .cache import get_catalog_version, get_nav_brands, get_nav_categories, get_site_settings
+
+
+def store_templates():
+    """Every template under store/templates, by the name get_template() takes."""
+    root = Path(apps.get_app_config('store').path) / 'templates'
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*.html'))
+
+
+def compile_templates():
+    """
+    Compiles the store templates into the cached template loader, which is
+    what serves them unless DEBUG sets up uncached loaders. Returns how many
+    were compiled; 0 without the cached loader, where compiling ahead would
+    gain nothing.
+    """
+    engine = engines['django'].engine
+    if not any(isinstance(loader, CachedLoader) for loader in engine.template_loaders):
+        return 0
+    names = store_templates()
+    for name in names:
+        engine.get_template(name)
+    return len(names)
+
+
+def load_urls():
+    # Imports every view module and compiles the route regexes
+    return len(get_resolver().reverse_dict)
+
+
+def prime_caches():
+    """Fills the navigation and settings caches every page reads."""
+    get_catalog_version()
+    settings = get_site_settings()
+    return len(settings) + len(get_nav_categories()) + len(get_nav_brands())
+
+
+def build_typeahead():
+    return len(typeahead.rebuild().items)
+
+
+WARMUP_STEPS = (
+    ('templates', compile_templates),
+    ('urls', load_urls),
+    ('caches', prime_caches),
+    ('typeahead', build_typeahead),
+)
+
+
+def warm_up():
+    """
+    Runs WARMUP_STEPS in this process; returns {step: (milliseconds, items)}.
+    Meant for the gunicorn master before it forks (see config/gunicorn.py),
+    so it closes the database connections it opened rather than hand them to
+    the workers.
+    """
+    timings = {}
+    try:
+        for name, step in WARMUP_STEPS:
+            start = time.perf_counter()
+            items = step()
+            timings[name] = ((time.perf_counter() - start) * 1000, items)
+    finally:
+        connections.close_all()
+        caches.close_all()
+    return timings